@@ -0,0 +1,31 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'partial_active_indexes'
+down_revision = 'add_user_auth'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Replace (x, is_active) indexes with partial covering indexes on active rows
+    op.drop_index('idx_account_user_active', table_name='accounts')
+    op.create_index(
+        'idx_account_user_active', 'accounts', ['clerk_user_id'],
+        postgresql_where=sa.text('is_active = true'),
+        postgresql_include=['id', 'name', 'account_type', 'balance']
+    )
+
+    op.drop_index('idx_asset_account_active', table_name='assets')
+    op.create_index(
+        'idx_asset_account_active', 'assets', ['account_id'],
+        postgresql_where=sa.text('is_active = true'),
+        postgresql_include=['symbol', 'shares', 'avg_cost', 'current_price']
+    )
+
+def downgrade() -> None:
+    op.drop_index('idx_asset_account_active', table_name='assets')
+    op.create_index('idx_asset_account_active', 'assets', ['account_id', 'is_active'])
+
+    op.drop_index('idx_account_user_active', table_name='accounts')
+    op.create_index('idx_account_user_active', 'accounts', ['clerk_user_id', 'is_active'])
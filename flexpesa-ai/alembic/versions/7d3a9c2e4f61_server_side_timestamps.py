@@ -0,0 +1,30 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'server_side_timestamps'
+down_revision = 'partial_active_indexes'
+branch_labels = None
+depends_on = None
+
+TIMESTAMP_COLUMNS = [
+    ('accounts', 'created_at'),
+    ('accounts', 'updated_at'),
+    ('assets', 'created_at'),
+    ('assets', 'last_updated'),
+    ('portfolio_snapshots', 'created_at'),
+    ('market_data_cache', 'created_at'),
+    ('market_data_cache', 'updated_at'),
+]
+
+# Columns are naive timestamps compared against datetime.utcnow(), so pin now() to UTC
+UTC_NOW = sa.text("timezone('utc', now())")
+
+def upgrade() -> None:
+    # Let the database fill timestamps instead of the application
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(table, column, server_default=UTC_NOW)
+
+def downgrade() -> None:
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(table, column, server_default=None)
@@ -0,0 +1,16 @@
+from alembic import op
+
+# revision identifiers
+revision = 'snapshot_brin_index'
+down_revision = 'server_side_timestamps'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index(
+        'idx_snapshot_created_brin', 'portfolio_snapshots', ['created_at'],
+        postgresql_using='brin'
+    )
+
+def downgrade() -> None:
+    op.drop_index('idx_snapshot_created_brin', table_name='portfolio_snapshots')
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 from typing import List, Dict, Optional, Any
 import asyncio
 import logging
@@ -71,7 +71,7 @@ class PortfolioCreateExtended(BaseModel):
     type: str = Field(..., min_length=1, max_length=50)
     initial_investment: float = Field(..., gt=0)
     expense_ratio: Optional[float] = Field(0.5, ge=0, le=5.0)
-    holdings: List[HoldingCreate] = []
+    holdings: List[HoldingCreate] = Field(default_factory=list)
 
 class PortfolioUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=100)
@@ -112,7 +112,9 @@ async def get_user_profile(
         user_id = user.get("sub")
 
         # Get user's accounts
-        accounts = db.query(AccountModel).filter(
+        accounts = db.query(AccountModel).options(
+            undefer(AccountModel.total_value)
+        ).filter(
             AccountModel.clerk_user_id == user_id,
             AccountModel.is_active == True
         ).all()
@@ -1,10 +1,41 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, PydanticBaseSettingsSource
 from pydantic import ConfigDict, field_validator
-from typing import Optional
+from dotenv import dotenv_values
+from typing import Any, Dict, Optional, Tuple
 from pathlib import Path
 import os
 import secrets
 
+# Accepted DATABASE_URL schemes
+_POSTGRES_PREFIX = "postgresql://"
+_ALLOWED_SCHEMES = (_POSTGRES_PREFIX, "sqlite:///")
+
+ENV_FILE = ".env"
+
+def _load_dotenv(path: str) -> Dict[str, str]:
+    """Parse an env file, lower-casing keys since settings are case-insensitive"""
+    return {
+        key.lower(): value
+        for key, value in dotenv_values(path, encoding="utf-8").items()
+        if value is not None
+    }
+
+# .env contents, read and parsed once at import
+_DOTENV_VALUES: Dict[str, str] = _load_dotenv(ENV_FILE)
+
+class DotEnvValuesSource(PydanticBaseSettingsSource):
+    """Settings source serving the .env values parsed at import"""
+
+    def get_field_value(self, field, field_name: str) -> Tuple[Any, str, bool]:
+        return _DOTENV_VALUES.get(field_name.lower()), field_name, False
+
+    def __call__(self) -> Dict[str, Any]:
+        return {
+            field_name: _DOTENV_VALUES[field_name.lower()]
+            for field_name in self.settings_cls.model_fields
+            if field_name.lower() in _DOTENV_VALUES
+        }
+
 class Settings(BaseSettings):
     # Basic API Configuration
     PROJECT_NAME: str = "Investment Portfolio MVP"
@@ -60,16 +91,14 @@ class Settings(BaseSettings):
     @field_validator('DATABASE_URL')
     @classmethod
     def validate_database_url(cls, v, info):
-        import os
-
         # Allow SQLite for testing environment
         if os.getenv('TESTING') == 'true' or info.data.get('ENVIRONMENT') == 'testing':
             # Allow both PostgreSQL and SQLite in development/testing
-            if v.startswith(("postgresql://", "sqlite:///")):
+            if v.startswith(_ALLOWED_SCHEMES):
                 return v
             raise ValueError("DATABASE_URL must use PostgreSQL (postgresql://) or SQLite (sqlite:///) format")
 
-        if not v.startswith("postgresql://"):
+        if not v.startswith(_POSTGRES_PREFIX):
             raise ValueError("DATABASE_URL must use PostgreSQL format: postgresql://...")
         return v
 
@@ -81,6 +110,11 @@ class Settings(BaseSettings):
             if "localhost" in self.DATABASE_URL:
                 self.DATABASE_URL = self.DATABASE_URL.replace("localhost", "postgres")
 
+    @property
+    def is_postgres(self) -> bool:
+        """Whether DATABASE_URL points at PostgreSQL"""
+        return self.DATABASE_URL.startswith(_POSTGRES_PREFIX)
+
     # API Keys (optional)
     NEWS_API_KEY: Optional[str] = None
     GEMINI_API_KEY: Optional[str] = None
@@ -107,6 +141,9 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_BURST: int = 100
+    RATE_LIMIT_STORAGE: str = "memory"  # "memory" (per worker) or "redis" (shared via REDIS_URL)
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.25  # seconds; a slower Redis is treated as down
+    RATE_LIMIT_REDIS_COOLDOWN: int = 30  # seconds on in-process limits after a Redis failure
 
     # Market Data Configuration
     MARKET_DATA_UPDATE_INTERVAL: int = 300  # 5 minutes
@@ -148,10 +185,21 @@ class Settings(BaseSettings):
     AI_ANALYSIS_TIMEOUT: int = 30  # seconds
     AI_MAX_SYMBOLS_PER_REQUEST: int = 20
 
-    # Configure Pydantic to read from .env file
+    @classmethod
+    def settings_customise_sources(
+        cls,
+        settings_cls,
+        init_settings: PydanticBaseSettingsSource,
+        env_settings: PydanticBaseSettingsSource,
+        dotenv_settings: PydanticBaseSettingsSource,
+        file_secret_settings: PydanticBaseSettingsSource,
+    ):
+        """Serve .env values parsed once at import instead of re-reading the file"""
+        return init_settings, env_settings, DotEnvValuesSource(settings_cls), file_secret_settings
+
+    # .env is read once at import (see DotEnvValuesSource), not by pydantic-settings
     model_config = ConfigDict(
-        env_file=".env",
-        env_file_encoding="utf-8",
+        env_file=None,
         case_sensitive=False,
         extra="ignore",
         validate_default=True
@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, DateTime
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import FunctionElement
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
@@ -16,7 +18,7 @@ engine_kwargs = {
 }
 
 # Add PostgreSQL-specific settings
-if settings.DATABASE_URL.startswith("postgresql://"):
+if settings.is_postgres:
     engine_kwargs.update({
         "poolclass": QueuePool,
         "pool_size": settings.DB_POOL_SIZE,
@@ -83,8 +85,37 @@ else:
 # Create base class for models
 Base = declarative_base()
 
+class utcnow(FunctionElement):
+    """Database-side current time in UTC, matching the naive datetime.utcnow() values used in Python"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    # now() follows the session time zone; pin it to UTC for the naive timestamp columns
+    return "timezone('utc', now())"
+
+class minutes_ago(FunctionElement):
+    """Database-side UTC time the given number of minutes before now"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(minutes_ago)
+def _minutes_ago_default(element, compiler, **kw):
+    # SQLite keeps timestamps as sortable text in the format datetime() returns
+    return "datetime('now', '-' || %s || ' minutes')" % compiler.process(element.clauses, **kw)
+
+@compiles(minutes_ago, "postgresql")
+def _minutes_ago_postgresql(element, compiler, **kw):
+    return "timezone('utc', now()) - make_interval(mins => %s)" % compiler.process(element.clauses, **kw)
+
 # Database event listeners for PostgreSQL
-if settings.DATABASE_URL.startswith("postgresql://"):
+if settings.is_postgres:
     @event.listens_for(engine, "connect")
     def set_postgresql_pragma(dbapi_connection, connection_record):
         """Set PostgreSQL connection parameters"""
@@ -154,24 +185,28 @@ if __name__ != "__main__":
     except Exception as e:
         logger.warning(f"Initial database check failed: {e}")
 
+# Settings don't change at runtime, so connection info is computed once at import
+_MASKED_URL = settings.DATABASE_URL.replace(
+    settings.DATABASE_URL.split("://")[1].split("@")[0], "***"
+)
+_CONN_INFO = {
+    "url": _MASKED_URL,
+    "pool_size": settings.DB_POOL_SIZE if settings.is_postgres else "N/A",
+    "max_overflow": settings.DB_MAX_OVERFLOW if settings.is_postgres else "N/A",
+}
+
 class DatabaseManager:
     """Database management utilities"""
 
     @staticmethod
     def get_connection_info():
         """Get database connection information"""
-        return {
-            "url": settings.DATABASE_URL.replace(
-                settings.DATABASE_URL.split("://")[1].split("@")[0], "***"
-            ),
-            "pool_size": settings.DB_POOL_SIZE if settings.DATABASE_URL.startswith("postgresql://") else "N/A",
-            "max_overflow": settings.DB_MAX_OVERFLOW if settings.DATABASE_URL.startswith("postgresql://") else "N/A",
-        }
+        return dict(_CONN_INFO)
 
     @staticmethod
     def get_pool_status():
         """Get connection pool status (PostgreSQL only)"""
-        if settings.DATABASE_URL.startswith("postgresql://"):
+        if settings.is_postgres:
             return {
                 "pool_size": engine.pool.size(),
                 "checked_out": engine.pool.checkedout(),
@@ -180,52 +215,13 @@ class DatabaseManager:
         return {"status": "SQLite - no pooling"}
 
 # Export commonly used objects
-__all__ = ["engine", "SessionLocal", "AsyncSessionLocal", "Base", "get_db", "get_async_db", "create_tables", "check_database_connection", "DatabaseManager"]
+__all__ = ["engine", "SessionLocal", "AsyncSessionLocal", "Base", "utcnow", "minutes_ago", "get_db", "get_async_db", "create_tables", "check_database_connection", "DatabaseManager"]
 
 def get_database_info():
     """Get database connection information for API response"""
     return {
-        "database_type": "PostgreSQL" if settings.DATABASE_URL.startswith("postgresql://") else "SQLite",
+        "database_type": "PostgreSQL" if settings.is_postgres else "SQLite",
         "database_name": settings.DATABASE_URL.split("/")[-1] if "/" in settings.DATABASE_URL else "portfolio_db",
-        "connection_pool": DatabaseManager.get_pool_status() if settings.DATABASE_URL.startswith("postgresql://") else "N/A",
+        "connection_pool": DatabaseManager.get_pool_status() if settings.is_postgres else "N/A",
         "status": "connected" if check_database_connection() else "disconnected"
     }
-
-# Add detailed health endpoint
-@app.get("/health/ready")
-async def readiness_check(db: Session = Depends(get_db)):
-    """Kubernetes-style readiness probe"""
-    checks = {
-        "database": False,
-        "redis": False,
-        "auth": False
-    }
-
-    # Database check
-    try:
-        db.execute(text("SELECT 1"))
-        checks["database"] = True
-    except:
-        pass
-
-    # Redis check (if configured)
-    try:
-        if settings.REDIS_URL:
-            # Add redis ping
-            checks["redis"] = True
-    except:
-        pass
-
-    # Auth check
-    checks["auth"] = bool(settings.CLERK_SECRET_KEY)
-
-    all_healthy = all(checks.values())
-
-    return JSONResponse(
-        status_code=200 if all_healthy else 503,
-        content={
-            "status": "ready" if all_healthy else "not_ready",
-            "checks": checks,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-    )
@@ -0,0 +1,69 @@
+"""
+Non-blocking logging configuration
+Request-path code only enqueues log records; a background QueueListener
+thread does the actual stream/file writes. Until the listener starts (and
+after it stops) handlers sit directly on the root logger, so nothing is
+queued without a consumer.
+"""
+
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_handlers: List[logging.Handler] = []
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+def add_log_handler(handler: logging.Handler):
+    """Register a root handler, fed by the queue listener while it is running"""
+    _handlers.append(handler)
+    if _listener is not None:
+        # The listener reads this tuple for every record, so swapping it is enough
+        _listener.handlers = tuple(_handlers)
+    else:
+        logging.getLogger().addHandler(handler)
+
+def configure_logging(level: str):
+    """Set the root level and install the console handler"""
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(getattr(logging, level.upper()))
+    add_log_handler(stream_handler)
+
+def start_log_listener():
+    """Move root logging onto the queue (call on application startup)"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    _listener = QueueListener(_log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+
+    # Install the new path before removing the old one so no record is dropped
+    root_logger = logging.getLogger()
+    _queue_handler = QueueHandler(_log_queue)
+    root_logger.addHandler(_queue_handler)
+    for handler in _handlers:
+        root_logger.removeHandler(handler)
+
+def stop_log_listener():
+    """Flush and stop the queue listener (call on application shutdown)"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+
+    root_logger = logging.getLogger()
+    for handler in _handlers:
+        root_logger.addHandler(handler)
+    root_logger.removeHandler(_queue_handler)
+    _queue_handler = None
+
+    # stop() drains whatever is still queued before returning
+    _listener.stop()
+    _listener = None
@@ -1,29 +1,60 @@
-from fastapi import FastAPI, Request, HTTPException, Response
+"""
+Investment Portfolio API application
+
+Middleware order, outermost to innermost (Starlette wraps the last added
+middleware around everything added before it):
+
+    CORS -> TrustedHost (production) -> ClerkAuth (unless DISABLE_AUTH)
+    -> RateLimit -> Logging -> GZip -> RequestSizeLimit -> routes
+
+Auth and rate limiting sit outside logging and compression so rejected
+requests are answered before reaching them; auth runs before the rate
+limiter so clients can be keyed by user ID. CORS stays outermost so 401
+and 429 responses still carry CORS headers.
+
+The trade-off is that LoggingMiddleware never sees 401/429 rejections, so
+those two middlewares log each rejection themselves and give it an
+X-Request-ID from the same sequence.
+"""
+
+from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import time
+import asyncio
 import logging
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from sqlalchemy import text
+from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.core.database import engine, Base, get_database_info, check_database_connection
+from app.core.logging_config import configure_logging, start_log_listener, stop_log_listener
+from app.core.database import engine, Base, get_db, get_database_info, check_database_connection
 from app.api.routes import router
 from app.api.auth_routes import router as auth_router
-from app.middleware.clerk_auth import ClerkAuthMiddleware
-from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.clerk_auth import ClerkAuthMiddleware, close_http_client
+from app.middleware.rate_limit import RateLimitMiddleware, close_redis_client
 from app.middleware.logging import LoggingMiddleware
+from app.services.enhanced_ai import close_http_session
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL.upper()),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging - records are queued and written by a background listener
+configure_logging(settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
+UTC = timezone.utc
+
+# Use uvloop's libuv-based event loop when available (not supported on Windows)
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    logger.debug("uvloop not installed, using default asyncio event loop")
+
 class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
     def __init__(self, app, max_upload_size: int = 10_000_000):  # 10MB
         super().__init__(app)
@@ -33,7 +64,7 @@ class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
         if request.method in ("POST", "PUT", "PATCH"):
             content_length = request.headers.get("content-length")
             if content_length and int(content_length) > self.max_upload_size:
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=413,
                     content={"error": "Request body too large"}
                 )
@@ -43,6 +74,7 @@ class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
+    start_log_listener()
     logger.info("🚀 Starting Investment Portfolio API")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Debug mode: {settings.DEBUG}")
@@ -66,6 +98,11 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("👋 Shutting down Investment Portfolio API")
+    await close_http_client()
+    await close_http_session()
+    await close_health_redis_client()
+    await close_redis_client()
+    stop_log_listener()
 
 # Create FastAPI application
 app = FastAPI(
@@ -74,41 +111,22 @@ app = FastAPI(
     version=settings.VERSION,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
-# Enhanced CORS configuration for Clerk
-@app.options("/{full_path:path}")
-async def options_handler(request: Request):
-    """Handle CORS preflight requests"""
-    return Response(
-        status_code=200,
-        headers={
-            "Access-Control-Allow-Origin": "*",  # Will be overridden by CORS middleware
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, x-clerk-session",
-            "Access-Control-Allow-Credentials": "true",
-        }
-    )
-
-# Security Middleware - Add trusted hosts for production
-if settings.ENVIRONMENT == "production":
-    app.add_middleware(
-        TrustedHostMiddleware,
-        allowed_hosts=["yourdomain.com", "*.yourdomain.com", "localhost", "*.clerk.accounts.dev"]
-    )
-
+# Middleware is added innermost first - see the module docstring for the resulting order
 app.add_middleware(RequestSizeLimitMiddleware, max_upload_size=10_000_000)
 
 # Compression Middleware
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
-# Custom Rate Limiting Middleware
-app.add_middleware(RateLimitMiddleware)
-
 # Custom Logging Middleware
 app.add_middleware(LoggingMiddleware)
 
+# Custom Rate Limiting Middleware
+app.add_middleware(RateLimitMiddleware)
+
 # Clerk Authentication Middleware - CONDITIONAL
 if not settings.DISABLE_AUTH:
     app.add_middleware(ClerkAuthMiddleware)
@@ -119,6 +137,13 @@ else:
     logger.warning(f"   Mock User ID: {settings.MOCK_USER_ID}")
     logger.warning(f"   Mock Email: {settings.MOCK_USER_EMAIL}")
 
+# Security Middleware - Add trusted hosts for production
+if settings.ENVIRONMENT == "production":
+    app.add_middleware(
+        TrustedHostMiddleware,
+        allowed_hosts=["yourdomain.com", "*.yourdomain.com", "localhost", "*.clerk.accounts.dev"]
+    )
+
 # CORS Middleware - Enhanced for Clerk
 allowed_origins = settings.get_allowed_origins()
 
@@ -135,17 +160,19 @@ app.add_middleware(
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
+    # Already lowercased to match what Starlette compares against
     allow_headers=[
         "*",
-        "Authorization",
-        "Content-Type",
-        "Accept",
-        "Origin",
-        "X-Requested-With",
-        "X-Clerk-Session",
-        "X-Clerk-Auth-Token"
+        "authorization",
+        "content-type",
+        "accept",
+        "origin",
+        "x-requested-with",
+        "x-clerk-session",
+        "x-clerk-auth-token"
     ],
-    expose_headers=["*"]
+    expose_headers=["*"],
+    max_age=86400  # Let browsers cache preflight responses for 24h
 )
 
 # Add a debug endpoint to check CORS configuration
@@ -169,7 +196,7 @@ def debug_cors():
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Global HTTP exception handler"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": True,
@@ -190,7 +217,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     else:
         message = str(exc)
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": True,
@@ -256,7 +283,7 @@ def health_check():
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={
                 "status": "unhealthy",
@@ -265,6 +292,64 @@ def health_check():
             }
         )
 
+# Redis client shared by readiness probes (created on first probe, closed on shutdown)
+_health_redis_client = None
+
+def _get_health_redis_client():
+    """Get (or lazily create) the Redis client used by the readiness probe"""
+    global _health_redis_client
+    if _health_redis_client is None:
+        import redis.asyncio as aioredis
+
+        _health_redis_client = aioredis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.HEALTH_CHECK_TIMEOUT,
+            socket_timeout=settings.HEALTH_CHECK_TIMEOUT
+        )
+    return _health_redis_client
+
+async def close_health_redis_client():
+    """Close the readiness probe's Redis client (call on application shutdown)"""
+    global _health_redis_client
+    if _health_redis_client is not None:
+        await _health_redis_client.aclose()
+        _health_redis_client = None
+
+@app.get("/health/ready")
+async def readiness_check(db: Session = Depends(get_db)):
+    """Kubernetes-style readiness probe"""
+
+    async def _check_db() -> bool:
+        await asyncio.to_thread(db.execute, text("SELECT 1"))
+        return True
+
+    async def _check_redis() -> bool:
+        if not settings.REDIS_URL:
+            return False
+        return bool(await _get_health_redis_client().ping())
+
+    # Database and Redis are independent network round-trips - run them concurrently
+    db_result, redis_result = await asyncio.gather(
+        _check_db(), _check_redis(), return_exceptions=True
+    )
+
+    checks = {
+        "database": db_result is True,
+        "redis": redis_result is True,
+        "auth": bool(settings.CLERK_SECRET_KEY)
+    }
+
+    all_healthy = all(checks.values())
+
+    return ORJSONResponse(
+        status_code=200 if all_healthy else 503,
+        content={
+            "status": "ready" if all_healthy else "not_ready",
+            "checks": checks,
+            "timestamp": datetime.now(UTC).isoformat(timespec="seconds")
+        }
+    )
+
 @app.get("/metrics")
 def get_metrics():
     """Basic metrics endpoint"""
@@ -311,5 +396,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=settings.BACKEND_PORT or 8000,
         reload=settings.DEBUG,
-        log_level=settings.LOG_LEVEL.lower()
+        log_level=settings.LOG_LEVEL.lower(),
+        loop="auto",  # uvloop when installed, asyncio otherwise (e.g. Windows)
+        http="httptools"
     )
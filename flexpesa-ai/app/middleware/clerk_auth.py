@@ -1,109 +1,193 @@
 import jwt
-import requests
+import json
+import asyncio
+import httpx
+from jwt.algorithms import RSAAlgorithm
 from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Mapping
+from types import MappingProxyType
 import time
-from functools import lru_cache
+import hashlib
+from collections import OrderedDict
 
 from app.core.config import settings
+from app.middleware.logging import new_request_id
 
 logger = logging.getLogger(__name__)
 
-class ClerkAuthMiddleware(BaseHTTPMiddleware):
-    """Clerk JWT Authentication Middleware"""
-
-    def __init__(self, app):
-        super().__init__(app)
+# Shared keep-alive client for JWKS refreshes; closed from the app lifespan
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Get (or lazily create) the shared async HTTP client"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=4)
+        )
+    return _http_client
+
+async def close_http_client():
+    """Close the shared async HTTP client (call on application shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Verified token payloads keyed by token digest: digest -> (expires_at, payload).
+# Payloads are stored read-only since every request with the token shares them
+_TOKEN_CACHE_MAX_SIZE = 10_000
+_TOKEN_CACHE_TTL = 300  # 5 minutes, never longer than the token's own exp
+_token_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+
+def _token_digest(token: str) -> bytes:
+    """Fixed-size cache key for a bearer token"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def _get_cached_payload(digest: bytes, now: float) -> Optional[Mapping[str, Any]]:
+    """Return the cached payload for a token digest if it has not expired"""
+    entry = _token_cache.get(digest)
+    if entry is None:
+        return None
+    expires_at, payload = entry
+    if expires_at <= now:
+        _token_cache.pop(digest, None)
+        return None
+    return payload
+
+def _cache_payload(digest: bytes, payload: Mapping[str, Any], now: float):
+    """Cache a verified payload until min(TTL, token exp)"""
+    expires_at = min(now + _TOKEN_CACHE_TTL, payload["exp"])
+    if expires_at <= now:
+        return
+    if len(_token_cache) >= _TOKEN_CACHE_MAX_SIZE:
+        _token_cache.popitem(last=False)
+    _token_cache[digest] = (expires_at, payload)
+
+class ClerkAuthMiddleware:
+    """Clerk JWT Authentication Middleware (pure ASGI)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
         self.clerk_secret_key = settings.CLERK_SECRET_KEY
         self.clerk_publishable_key = settings.CLERK_PUBLISHABLE_KEY
 
         # Public endpoints that don't require authentication
-        self.public_endpoints = {
-            "/",
-            "/health",
-            "/docs",
-            "/redoc",
-            "/openapi.json",
-            "/metrics"
-        }
+        self._public_exact = frozenset({"/", "/health", "/openapi.json", "/metrics"})
+        self._public_prefixes = ("/docs", "/redoc", "/health", "/openapi.json")
 
         # Cache for JWKS
-        self._jwks_cache = {}
+        self._jwks_cache: Mapping[str, Any] = MappingProxyType({})
         self._jwks_cache_time = 0
         self._jwks_cache_ttl = 3600  # 1 hour
+        self._jwks_lock = asyncio.Lock()
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Process the request and validate Clerk JWT if required"""
 
-        # Skip authentication for public endpoints
-        if self._is_public_endpoint(request.url.path):
-            return await call_next(request)
-
-        # Skip authentication for OPTIONS requests (CORS preflight)
-        if request.method == "OPTIONS":
-            return await call_next(request)
-
-        try:
-            # Extract and validate JWT token
-            user_data = await self._validate_clerk_token(request)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-            if user_data:
-                # Add user data to request state
-                request.state.user = user_data
-                request.state.user_id = user_data.get("sub")
-                request.state.authenticated = True
-            else:
-                request.state.authenticated = False
+        path = scope["path"]
 
-                # Return 401 for API endpoints requiring authentication
-                if request.url.path.startswith("/api/"):
-                    raise HTTPException(status_code=401, detail="Authentication required")
+        # Skip authentication for public endpoints and OPTIONS requests (CORS preflight)
+        if self._is_public_endpoint(path) or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
 
-            response = await call_next(request)
-            return response
+        # Starlette exposes scope["state"] as request.state
+        state = scope.setdefault("state", {})
 
-        except HTTPException:
-            raise
+        try:
+            # Extract and validate JWT token
+            user_data = await self._validate_clerk_token(self._get_auth_header(scope))
         except Exception as e:
             logger.error(f"Authentication error: {e}")
 
             # Return 401 for API endpoints
-            if request.url.path.startswith("/api/"):
-                raise HTTPException(status_code=401, detail="Authentication failed")
+            if path.startswith("/api/"):
+                await self._send_unauthorized(scope, send, "Authentication failed")
+                return
 
             # For non-API endpoints, continue without authentication
-            request.state.authenticated = False
-            return await call_next(request)
+            state["authenticated"] = False
+            await self.app(scope, receive, send)
+            return
+
+        if user_data:
+            # Add user data to request state
+            state["user"] = user_data
+            state["user_id"] = user_data.get("sub")
+            state["authenticated"] = True
+        else:
+            state["authenticated"] = False
+
+            # Return 401 for API endpoints requiring authentication
+            if path.startswith("/api/"):
+                await self._send_unauthorized(scope, send, "Authentication required")
+                return
+
+        await self.app(scope, receive, send)
+
+    async def _send_unauthorized(self, scope: Scope, send: Send, message: str):
+        """Send a 401 JSON response directly, without HTTPException machinery
+
+        LoggingMiddleware sits inside this middleware and never sees the
+        rejection, so it is logged and tagged with a request ID here.
+        """
+        request_id = new_request_id()
+        logger.warning(f"[{request_id}] {scope['method']} {scope['path']} - 401 {message}")
+
+        body = json.dumps({
+            "error": True,
+            "message": message,
+            "status_code": 401,
+            "timestamp": time.time()
+        }).encode()
+
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-request-id", request_id.encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
 
     def _is_public_endpoint(self, path: str) -> bool:
         """Check if endpoint is public and doesn't require authentication"""
-        # Exact match
-        if path in self.public_endpoints:
-            return True
-
-        # Pattern matching for documentation endpoints
-        if path.startswith(("/docs", "/redoc", "/openapi.json")):
-            return True
+        return path in self._public_exact or path.startswith(self._public_prefixes)
 
-        # Health check endpoints
-        if path.startswith("/health"):
-            return True
+    def _get_auth_header(self, scope: Scope) -> Optional[str]:
+        """Read the Authorization header straight from the ASGI scope"""
+        for key, value in scope["headers"]:
+            if key == b"authorization":
+                return value.decode("latin-1")
+        return None
 
-        return False
-
-    async def _validate_clerk_token(self, request: Request) -> Optional[Dict[str, Any]]:
+    async def _validate_clerk_token(self, auth_header: Optional[str]) -> Optional[Mapping[str, Any]]:
         """Validate Clerk JWT token and return user data"""
 
         # Extract token from Authorization header
-        auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
             return None
 
         token = auth_header.split(" ")[1]
 
+        # Repeat requests with the same token skip RSA verification
+        now = time.time()
+        digest = _token_digest(token)
+        cached = _get_cached_payload(digest, now)
+        if cached is not None:
+            return cached
+
         try:
             # Get Clerk JWKS for token verification
             jwks = await self._get_clerk_jwks()
@@ -116,23 +200,20 @@ class ClerkAuthMiddleware(BaseHTTPMiddleware):
                 logger.warning(f"Invalid key ID in JWT: {key_id}")
                 return None
 
-            # Get the public key
+            # Get the public key (an already-parsed RSA key object, no per-request parsing)
             public_key = jwks[key_id]
 
-            # Verify and decode the token
-            payload = jwt.decode(
+            # Verify and decode the token; claim presence and issuer are checked by PyJWT
+            payload = MappingProxyType(jwt.decode(
                 token,
                 public_key,
                 algorithms=["RS256"],
                 audience=settings.CLERK_PUBLISHABLE_KEY,
-                options={"verify_exp": True, "verify_aud": True}
-            )
-
-            # Validate token claims
-            if payload.get("iss") != f"https://{settings.CLERK_DOMAIN}":
-                logger.warning("Invalid issuer in JWT")
-                return None
+                issuer=f"https://{settings.CLERK_DOMAIN}",
+                options={"verify_exp": True, "verify_aud": True, "require": ["exp", "iss", "aud"]}
+            ))
 
+            _cache_payload(digest, payload, now)
             return payload
 
         except jwt.ExpiredSignatureError:
@@ -145,49 +226,55 @@ class ClerkAuthMiddleware(BaseHTTPMiddleware):
             logger.error(f"JWT validation error: {e}")
             return None
 
-    @lru_cache(maxsize=1)
-    async def _get_clerk_jwks(self) -> Dict[str, Any]:
+    def _jwks_cache_fresh(self, current_time: float) -> bool:
+        """Whether the cached JWKS is populated and within its TTL"""
+        return bool(self._jwks_cache) and (current_time - self._jwks_cache_time) < self._jwks_cache_ttl
+
+    async def _get_clerk_jwks(self) -> Mapping[str, Any]:
         """Get Clerk JWKS (JSON Web Key Set) for token verification"""
 
-        # Check cache first
-        current_time = time.time()
-        if (self._jwks_cache and
-            current_time - self._jwks_cache_time < self._jwks_cache_ttl):
+        # Fast path: serve cached keys without taking the lock
+        if self._jwks_cache_fresh(time.monotonic()):
             return self._jwks_cache
 
-        try:
-            # Fetch JWKS from Clerk
-            jwks_url = f"https://{settings.CLERK_DOMAIN}/.well-known/jwks.json"
-            response = requests.get(jwks_url, timeout=10)
-            response.raise_for_status()
-
-            jwks_data = response.json()
+        async with self._jwks_lock:
+            # Another request may have refreshed the keys while we waited
+            current_time = time.monotonic()
+            if self._jwks_cache_fresh(current_time):
+                return self._jwks_cache
 
-            # Process JWKS keys
-            processed_keys = {}
-            for key in jwks_data.get("keys", []):
-                kid = key.get("kid")
-                if kid:
-                    # Convert JWK to PEM format for PyJWT
-                    from jwt.algorithms import RSAAlgorithm
-                    public_key = RSAAlgorithm.from_jwk(key)
-                    processed_keys[kid] = public_key
+            try:
+                # Fetch JWKS from Clerk
+                jwks_url = f"https://{settings.CLERK_DOMAIN}/.well-known/jwks.json"
+                response = await _get_http_client().get(jwks_url)
+                response.raise_for_status()
 
-            # Update cache
-            self._jwks_cache = processed_keys
-            self._jwks_cache_time = current_time
+                jwks_data = response.json()
 
-            return processed_keys
+                # Process JWKS keys
+                processed_keys = {}
+                for key in jwks_data.get("keys", []):
+                    kid = key.get("kid")
+                    if kid:
+                        # Parse once into an RSA key object that jwt.decode accepts directly
+                        public_key = RSAAlgorithm.from_jwk(key)
+                        processed_keys[kid] = public_key
 
-        except Exception as e:
-            logger.error(f"Failed to fetch Clerk JWKS: {e}")
+                # Update cache - read-only so callers can share it without copying
+                self._jwks_cache = MappingProxyType(processed_keys)
+                self._jwks_cache_time = current_time
 
-            # Return cached keys if available
-            if self._jwks_cache:
-                logger.warning("Using cached JWKS due to fetch failure")
                 return self._jwks_cache
 
-            return {}
+            except Exception as e:
+                logger.error(f"Failed to fetch Clerk JWKS: {e}")
+
+                # Return cached keys if available
+                if self._jwks_cache:
+                    logger.warning("Using cached JWKS due to fetch failure")
+                    return self._jwks_cache
+
+                return {}
 
 # Dependency for protected routes
 async def get_current_user(request: Request) -> Dict[str, Any]:
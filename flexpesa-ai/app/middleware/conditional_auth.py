@@ -4,23 +4,34 @@ Provides mock authentication when DISABLE_AUTH is True
 """
 
 from fastapi import Request, HTTPException
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Mapping
+from types import MappingProxyType
 import logging
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-def get_mock_user() -> Dict[str, Any]:
+# Resolve the real auth backend once; like the middleware stack in main.py,
+# the auth mode is fixed at startup
+if settings.DISABLE_AUTH:
+    _clerk = None
+else:
+    from app.middleware import clerk_auth as _clerk
+
+# Built once and shared read-only across requests
+_MOCK_USER: Mapping[str, Any] = MappingProxyType({
+    "sub": settings.MOCK_USER_ID,
+    "email": settings.MOCK_USER_EMAIL,
+    "first_name": settings.MOCK_USER_FIRST_NAME,
+    "last_name": settings.MOCK_USER_LAST_NAME,
+    "iss": "mock-auth-provider",
+    "aud": "mock-audience"
+})
+
+def get_mock_user() -> Mapping[str, Any]:
     """Get mock user data for development/testing"""
-    return {
-        "sub": settings.MOCK_USER_ID,
-        "email": settings.MOCK_USER_EMAIL,
-        "first_name": settings.MOCK_USER_FIRST_NAME,
-        "last_name": settings.MOCK_USER_LAST_NAME,
-        "iss": "mock-auth-provider",
-        "aud": "mock-audience"
-    }
+    return _MOCK_USER
 
 async def get_current_user(request: Request) -> Dict[str, Any]:
     """Get current authenticated user (real or mock)"""
@@ -31,8 +42,7 @@ async def get_current_user(request: Request) -> Dict[str, Any]:
         return get_mock_user()
     else:
         # Use real Clerk authentication
-        from app.middleware.clerk_auth import get_current_user as _get_current_user
-        return await _get_current_user(request)
+        return await _clerk.get_current_user(request)
 
 async def get_current_user_optional(request: Request) -> Optional[Dict[str, Any]]:
     """Get current user if authenticated (optional)"""
@@ -42,8 +52,7 @@ async def get_current_user_optional(request: Request) -> Optional[Dict[str, Any]
         return get_mock_user()
     else:
         # Use real Clerk authentication
-        from app.middleware.clerk_auth import get_current_user_optional as _get_current_user_optional
-        return await _get_current_user_optional(request)
+        return await _clerk.get_current_user_optional(request)
 
 async def get_user_id(request: Request) -> str:
     """Get current user ID"""
@@ -52,8 +61,7 @@ async def get_user_id(request: Request) -> str:
         return settings.MOCK_USER_ID
     else:
         # Use real Clerk authentication
-        from app.middleware.clerk_auth import get_user_id as _get_user_id
-        return await _get_user_id(request)
+        return await _clerk.get_user_id(request)
 
 def is_authenticated(request: Request) -> bool:
     """Check if user is authenticated"""
@@ -62,5 +70,4 @@ def is_authenticated(request: Request) -> bool:
         return True  # Always authenticated in mock mode
     else:
         # Use real Clerk authentication
-        from app.middleware.clerk_auth import is_authenticated as _is_authenticated
-        return _is_authenticated(request)
\ No newline at end of file
+        return _clerk.is_authenticated(request)
\ No newline at end of file
@@ -1,112 +1,135 @@
 import time
 import json
-import uuid
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+import secrets
+import itertools
+from starlette.datastructures import URL, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
 from typing import Optional
 from urllib.parse import unquote
 
 from app.core.config import settings
+from app.core.logging_config import add_log_handler
 
 logger = logging.getLogger(__name__)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Enhanced logging middleware for request/response logging"""
+# Request IDs: random per-worker prefix + monotonically increasing counter
+_PREFIX = secrets.token_hex(2)
+_COUNTER = itertools.count()
 
-    def __init__(self, app):
-        super().__init__(app)
-        self.sensitive_headers = {
-            "authorization", "cookie", "x-api-key",
-            "x-auth-token", "x-access-token"
-        }
+def new_request_id() -> str:
+    """Next request ID; also used by middleware that answers before LoggingMiddleware runs"""
+    return f"{_PREFIX}{next(_COUNTER):06x}"
+
+class LoggingMiddleware:
+    """Enhanced logging middleware for request/response logging (pure ASGI)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # ASGI header names are lowercased bytes, so compare against them directly
+        self.sensitive_headers = frozenset({
+            b"authorization", b"cookie", b"x-api-key",
+            b"x-auth-token", b"x-access-token"
+        })
         self.sensitive_params = {
             "password", "token", "secret", "key", "api_key"
         }
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Log request and response details"""
 
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Generate unique request ID
-        request_id = str(uuid.uuid4())[:8]
+        request_id = new_request_id()
 
         # Start timing
-        start_time = time.time()
+        start_time = time.perf_counter()
 
-        # Add request ID to request state
-        request.state.request_id = request_id
+        # Add request ID to request state (Starlette exposes scope["state"] as request.state)
+        scope.setdefault("state", {})["request_id"] = request_id
 
         # Log request
-        await self._log_request(request, request_id)
+        self._log_request(scope, request_id)
 
-        # Process request
-        try:
-            response = await call_next(request)
+        status_code = None
 
-            # Calculate processing time
-            process_time = time.time() - start_time
+        async def send_wrapper(message: Message):
+            nonlocal status_code
 
-            # Log response
-            await self._log_response(request, response, request_id, process_time)
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                process_time = time.perf_counter() - start_time
 
-            # Add custom headers
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-Process-Time"] = f"{process_time:.4f}"
+                # Add custom headers
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                headers.append((b"x-process-time", f"{process_time:.4f}".encode()))
+                message = {**message, "headers": headers}
 
-            return response
+            await send(message)
 
+        # Process request
+        try:
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            process_time = time.time() - start_time
-            await self._log_error(request, e, request_id, process_time)
+            process_time = time.perf_counter() - start_time
+            self._log_error(scope, e, request_id, process_time)
             raise
 
-    async def _log_request(self, request: Request, request_id: str):
+        # Calculate processing time and log response
+        process_time = time.perf_counter() - start_time
+        self._log_response(scope, status_code, request_id, process_time)
+
+    def _log_request(self, scope: Scope, request_id: str):
         """Log incoming request details"""
 
         # Extract basic request info
-        method = request.method
-        url = str(request.url)
-        user_agent = request.headers.get("user-agent", "unknown")
+        method = scope["method"]
+        path = scope["path"]
+        user_agent = next(
+            (value.decode("latin-1") for key, value in scope["headers"] if key == b"user-agent"),
+            "unknown"
+        )
 
         # Get client info
-        client_ip = self._get_client_ip(request)
-
-        # Get user info if available
-        user_info = self._get_user_info(request)
-
-        # Sanitize query parameters
-        query_params = dict(request.query_params)
-        sanitized_params = self._sanitize_data(query_params)
-
-        # Create log entry
-        log_data = {
-            "type": "request",
-            "request_id": request_id,
-            "method": method,
-            "url": unquote(url),
-            "path": request.url.path,
-            "query_params": sanitized_params,
-            "client_ip": client_ip,
-            "user_agent": user_agent,
-            "user_info": user_info,
-            "headers": self._sanitize_headers(dict(request.headers)),
-            "timestamp": time.time()
-        }
+        client_ip = self._get_client_ip(scope)
 
         # Log at appropriate level
         if settings.DEBUG:
-            logger.info(f"[{request_id}] {method} {request.url.path} - {client_ip}")
-            logger.debug(f"Request details: {json.dumps(log_data, indent=2)}")
+            logger.info(f"[{request_id}] {method} {path} - {client_ip}")
+
+            # Only build the detailed entry when it will actually be emitted
+            if logger.isEnabledFor(logging.DEBUG):
+                query_params = dict(QueryParams(scope.get("query_string", b"")))
+
+                log_data = {
+                    "type": "request",
+                    "request_id": request_id,
+                    "method": method,
+                    "url": unquote(str(URL(scope=scope))),
+                    "path": path,
+                    "query_params": self._sanitize_data(query_params),
+                    "client_ip": client_ip,
+                    "user_agent": user_agent,
+                    "user_info": self._get_user_info(scope),
+                    "headers": self._sanitize_headers(scope.get("headers", [])),
+                    "timestamp": time.time()
+                }
+                logger.debug(f"Request details: {json.dumps(log_data, indent=2)}")
         else:
-            logger.info(f"[{request_id}] {method} {request.url.path} - {client_ip} - {user_agent[:50]}")
+            logger.info(f"[{request_id}] {method} {path} - {client_ip} - {user_agent[:50]}")
 
-    async def _log_response(self, request: Request, response: Response,
-                        request_id: str, process_time: float):
+    def _log_response(self, scope: Scope, status_code: Optional[int],
+                      request_id: str, process_time: float):
         """Log response details"""
 
+        method = scope["method"]
+        path = scope["path"]
+
         # Fix: Handle None status_code properly
-        status_code = getattr(response, 'status_code', None)
         if status_code is None:
             # For OPTIONS responses that don't have status_code set
             status_code = 200  # Default to 200 for successful responses
@@ -123,102 +146,108 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             log_level = logging.INFO
             level_name = "INFO"
 
-        # Create log entry
-        log_data = {
-            "type": "response",
-            "request_id": request_id,
-            "status_code": status_code,
-            "process_time": round(process_time, 4),
-            "method": request.method,
-            "path": request.url.path,
-            "user_info": self._get_user_info(request),
-            "timestamp": time.time()
-        }
-
         # Log response
         logger.log(
             log_level,
-            f"[{request_id}] {request.method} {request.url.path} - "
+            f"[{request_id}] {method} {path} - "
             f"{status_code} - {process_time:.4f}s"
         )
 
         # Detailed debug logging
-        if settings.DEBUG and status_code >= 400:
+        if settings.DEBUG and status_code >= 400 and logger.isEnabledFor(logging.DEBUG):
+            log_data = {
+                "type": "response",
+                "request_id": request_id,
+                "status_code": status_code,
+                "process_time": round(process_time, 4),
+                "method": method,
+                "path": path,
+                "user_info": self._get_user_info(scope),
+                "timestamp": time.time()
+            }
             logger.debug(f"Response details: {json.dumps(log_data, indent=2)}")
 
         # Log slow requests
         if process_time > 5.0:  # Requests taking more than 5 seconds
             logger.warning(
-                f"[{request_id}] SLOW REQUEST: {request.method} {request.url.path} - "
+                f"[{request_id}] SLOW REQUEST: {method} {path} - "
                 f"{process_time:.4f}s - {status_code}"
             )
 
-    async def _log_error(self, request: Request, error: Exception,
-                        request_id: str, process_time: float):
+    def _log_error(self, scope: Scope, error: Exception,
+                   request_id: str, process_time: float):
         """Log error details"""
 
+        method = scope["method"]
+        path = scope["path"]
         error_type = type(error).__name__
         error_message = str(error)
 
-        log_data = {
-            "type": "error",
-            "request_id": request_id,
-            "error_type": error_type,
-            "error_message": error_message,
-            "process_time": round(process_time, 4),
-            "method": request.method,
-            "path": request.url.path,
-            "user_info": self._get_user_info(request),
-            "timestamp": time.time()
-        }
-
         logger.error(
-            f"[{request_id}] ERROR: {request.method} {request.url.path} - "
+            f"[{request_id}] ERROR: {method} {path} - "
             f"{error_type}: {error_message} - {process_time:.4f}s"
         )
 
         if settings.DEBUG:
+            log_data = {
+                "type": "error",
+                "request_id": request_id,
+                "error_type": error_type,
+                "error_message": error_message,
+                "process_time": round(process_time, 4),
+                "method": method,
+                "path": path,
+                "user_info": self._get_user_info(scope),
+                "timestamp": time.time()
+            }
             logger.debug(f"Error details: {json.dumps(log_data, indent=2)}")
 
-    def _get_client_ip(self, request: Request) -> str:
+    def _get_client_ip(self, scope: Scope) -> str:
         """Get client IP address, handling proxies"""
 
-        # Check for forwarded headers
-        forwarded_for = request.headers.get("X-Forwarded-For")
+        # Single pass over the raw ASGI headers for the forwarded headers
+        forwarded_for = real_ip = None
+        for key, value in scope["headers"]:
+            if key == b"x-forwarded-for":
+                forwarded_for = value
+            elif key == b"x-real-ip":
+                real_ip = value
+
         if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
+            return forwarded_for.split(b",", 1)[0].strip().decode("latin-1")
 
-        real_ip = request.headers.get("X-Real-IP")
         if real_ip:
-            return real_ip
+            return real_ip.decode("latin-1")
 
         # Fallback to direct client IP
-        return request.client.host if request.client else "unknown"
+        client = scope.get("client")
+        return client[0] if client else "unknown"
 
-    def _get_user_info(self, request: Request) -> Optional[dict]:
-        """Extract user information from request"""
+    def _get_user_info(self, scope: Scope) -> Optional[dict]:
+        """Extract user information from request state"""
 
-        if not hasattr(request.state, 'user') or not request.state.user:
+        state = scope.get("state") or {}
+        user = state.get("user")
+        if not user:
             return None
 
-        user = request.state.user
         return {
             "user_id": user.get("sub") or user.get("user_id"),
             "email": user.get("email"),
-            "authenticated": getattr(request.state, 'authenticated', False)
+            "authenticated": state.get("authenticated", False)
         }
 
-    def _sanitize_headers(self, headers: dict) -> dict:
-        """Remove sensitive headers from logs"""
+    def _sanitize_headers(self, raw_headers: list) -> dict:
+        """Remove sensitive headers from logs (takes raw ASGI header pairs)"""
 
-        sanitized = {}
-        for key, value in headers.items():
-            if key.lower() in self.sensitive_headers:
-                sanitized[key] = "[REDACTED]"
-            else:
-                sanitized[key] = value
+        # Fast path: nothing to redact
+        if self.sensitive_headers.isdisjoint(key for key, _ in raw_headers):
+            return {key.decode("latin-1"): value.decode("latin-1") for key, value in raw_headers}
 
-        return sanitized
+        return {
+            key.decode("latin-1"): "[REDACTED]" if key in self.sensitive_headers else value.decode("latin-1")
+            for key, value in raw_headers
+        }
 
     def _sanitize_data(self, data: dict) -> dict:
         """Remove sensitive data from logs"""
@@ -259,7 +288,9 @@ class BusinessLogger:
             )
             file_handler.setFormatter(formatter)
 
-            self.logger.addHandler(file_handler)
+            # Written by the queue listener thread; only business records go to this file
+            file_handler.addFilter(logging.Filter("business"))
+            add_log_handler(file_handler)
 
     def log_portfolio_update(self, user_id: str, portfolio_value: float,
                            assets_updated: int):
@@ -1,23 +1,97 @@
 import time
-import asyncio
-from collections import defaultdict, deque
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+import json
+from collections import OrderedDict, defaultdict, deque
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
-from typing import Dict, Deque
+from typing import Dict, Deque, List, NamedTuple, Optional, Tuple
 import hashlib
+import bisect
+import math
+from functools import lru_cache
 
 from app.core.config import settings
+from app.middleware.logging import new_request_id
 
 logger = logging.getLogger(__name__)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware with sliding window approach"""
+# Keyed hashing so client IPs can't be recovered from rate limit keys;
+# derived once because blake2b keys are limited to 64 bytes
+_RL_SECRET = hashlib.blake2b(settings.SECRET_KEY.encode(), digest_size=32).digest()
 
-    def __init__(self, app):
-        super().__init__(app)
-        self.requests: Dict[str, Deque[float]] = defaultdict(deque)
+@lru_cache(maxsize=16384)
+def _hash_ip(client_ip: str) -> str:
+    """Privacy-preserving client IP identifier (cached for repeat clients)"""
+    return hashlib.blake2b(client_ip.encode(), digest_size=8, key=_RL_SECRET).hexdigest()
+
+_redis_client = None
+
+def _get_redis_client():
+    """Get (or lazily create) the Redis client shared by rate limit checks"""
+    global _redis_client
+    if _redis_client is None:
+        import redis.asyncio as aioredis
+
+        # Short timeouts: a slow Redis must not hold up every request
+        _redis_client = aioredis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+            socket_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT
+        )
+    return _redis_client
+
+async def close_redis_client():
+    """Close the rate limiter's Redis client (call on application shutdown)"""
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
+
+# Atomically refill and take from a shared token bucket - the same algorithm and
+# capacity as the in-process buckets, so the effective limit doesn't change when
+# the limiter falls back to memory. Redis's own clock keeps workers consistent;
+# idle buckets expire once they would be full again.
+# ARGV: capacity, refill rate (tokens/second), ttl (seconds)
+_REDIS_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+if tokens == nil then
+    tokens = capacity
+else
+    tokens = math.min(capacity, tokens + (now - tonumber(bucket[2])) * rate)
+end
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {allowed, math.floor(tokens)}
+"""
+
+class RateLimitRule(NamedTuple):
+    """A per-window limit and the bucket scope it is counted in"""
+    key: str  # endpoint prefix, or "default" for the general limit
+    limit: int  # tokens refilled per window
+    capacity: int  # most tokens a client can bank for this rule
+
+class RateLimitMiddleware:
+    """Rate limiting middleware with per-client token buckets (pure ASGI)"""
+
+    # Paths that are never rate limited
+    SKIP_PATHS = frozenset({"/", "/health", "/docs", "/redoc", "/openapi.json", "/metrics"})
+    SKIP_PREFIXES = ("/docs", "/redoc")
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # (client_id, rule key) -> [tokens, last_refill]; a list so it can be updated
+        # in place. Kept in least-recently-used order and capped at max_clients.
+        self.buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self.max_clients = 50_000
         self.window_size = 60  # 60 seconds window
         self.max_requests = settings.RATE_LIMIT_PER_MINUTE
         self.burst_limit = settings.RATE_LIMIT_BURST
@@ -29,178 +103,237 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             "/api/v1/portfolio/summary": 30,  # Portfolio data
         }
 
-        # Cleanup task
-        self._cleanup_task = None
-        self._start_cleanup_task()
-
-    async def dispatch(self, request: Request, call_next):
+        # Each endpoint limit gets its own bucket so a strict endpoint never drains
+        # the general allowance. The default limit may burst up to RATE_LIMIT_BURST;
+        # endpoint-specific limits never bank more than their own per-window limit.
+        self._default_rule = RateLimitRule("default", self.max_requests, max(self.max_requests, self.burst_limit))
+
+        # Sorted prefixes for bisect lookup (the prefixes above must not nest)
+        self._sorted_prefixes = sorted(self.endpoint_limits)
+        self._prefix_rules = [
+            RateLimitRule(prefix, self.endpoint_limits[prefix], self.endpoint_limits[prefix])
+            for prefix in self._sorted_prefixes
+        ]
+
+        # Shared Redis buckets so limits hold across uvicorn workers. After a
+        # failure Redis is skipped until _redis_retry_at (monotonic seconds).
+        self._redis_bucket = None
+        self._redis_retry_at = 0.0
+        self._redis_down = False
+        if settings.RATE_LIMIT_STORAGE == "redis" and settings.REDIS_URL:
+            self._redis_bucket = _get_redis_client().register_script(_REDIS_BUCKET_SCRIPT)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Process request with rate limiting"""
-        from app.core.config import settings
-        if settings.DISABLE_RATE_LIMITING:
-            return await call_next(request)
+
+        if scope["type"] != "http" or settings.DISABLE_RATE_LIMITING:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+
         # Skip rate limiting for health checks and docs
-        if self._should_skip_rate_limit(request.url.path):
-            return await call_next(request)
+        if self._should_skip_rate_limit(path):
+            await self.app(scope, receive, send)
+            return
 
         # Get client identifier
-        client_id = self._get_client_id(request)
+        client_id = self._get_client_id(scope)
 
         # Get rate limit for this endpoint
-        rate_limit = self._get_rate_limit(request.url.path)
+        rule = self._get_rate_limit(path)
+        rate_limit = rule.limit
 
         # Check rate limit
-        if not self._check_rate_limit(client_id, rate_limit):
-            return self._rate_limit_response(client_id, rate_limit)
+        result = None
+        if self._redis_bucket is not None:
+            result = await self._check_rate_limit_redis(client_id, rule)
 
-        # Record the request
-        self._record_request(client_id)
+        if result is not None:
+            allowed, remaining = result
+        else:
+            allowed, remaining = self._check_and_record(client_id, rule, time.monotonic())
 
-        # Process request
-        response = await call_next(request)
+        if not allowed:
+            await self._send_rate_limited(scope, send, client_id, rate_limit, remaining)
+            return
 
-        # Add rate limit headers
-        remaining = self._get_remaining_requests(client_id, rate_limit)
-        response.headers["X-Rate-Limit-Limit"] = str(rate_limit)
-        response.headers["X-Rate-Limit-Remaining"] = str(max(0, remaining))
-        response.headers["X-Rate-Limit-Reset"] = str(int(time.time() + self.window_size))
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # Add rate limit headers
+                headers = list(message.get("headers", []))
+                headers.append((b"x-rate-limit-limit", str(rate_limit).encode()))
+                headers.append((b"x-rate-limit-remaining", str(max(0, remaining)).encode()))
+                headers.append((b"x-rate-limit-reset", str(int(time.time()) + self.window_size).encode()))
+                message = {**message, "headers": headers}
 
-        return response
+            await send(message)
+
+        # Process request
+        await self.app(scope, receive, send_wrapper)
 
     def _should_skip_rate_limit(self, path: str) -> bool:
         """Check if path should skip rate limiting"""
-        skip_paths = {
-            "/", "/health", "/docs", "/redoc", "/openapi.json", "/metrics"
-        }
-
-        return path in skip_paths or path.startswith(("/docs", "/redoc"))
+        return path in self.SKIP_PATHS or path.startswith(self.SKIP_PREFIXES)
 
-    def _get_client_id(self, request: Request) -> str:
+    def _get_client_id(self, scope: Scope) -> str:
         """Get unique client identifier for rate limiting"""
 
-        # Try to get user ID from authentication
-        if hasattr(request.state, 'user_id') and request.state.user_id:
-            return f"user:{request.state.user_id}"
+        # Try to get user ID from authentication (set by ClerkAuthMiddleware)
+        user_id = (scope.get("state") or {}).get("user_id")
+        if user_id:
+            return f"user:{user_id}"
 
         # Use IP address as fallback
         # Check for forwarded IP (when behind proxy)
-        forwarded_for = request.headers.get("X-Forwarded-For")
+        forwarded_for = None
+        for key, value in scope["headers"]:
+            if key == b"x-forwarded-for":
+                forwarded_for = value
+                break
+
         if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
+            client_ip = forwarded_for.split(b",", 1)[0].strip().decode("latin-1")
         else:
-            client_ip = request.client.host if request.client else "unknown"
+            client = scope.get("client")
+            client_ip = client[0] if client else "unknown"
 
         # Hash IP for privacy
-        ip_hash = hashlib.sha256(client_ip.encode()).hexdigest()[:16]
-        return f"ip:{ip_hash}"
+        return f"ip:{_hash_ip(client_ip)}"
 
-    def _get_rate_limit(self, path: str) -> int:
-        """Get rate limit for specific endpoint"""
+    def _get_rate_limit(self, path: str) -> RateLimitRule:
+        """Get rate limit rule for specific endpoint"""
 
-        # Check for specific endpoint limits
-        for endpoint_pattern, limit in self.endpoint_limits.items():
-            if path.startswith(endpoint_pattern):
-                return limit
+        # The only prefix that can match is the greatest one sorting <= path
+        idx = bisect.bisect_right(self._sorted_prefixes, path)
+        if idx and path.startswith(self._sorted_prefixes[idx - 1]):
+            return self._prefix_rules[idx - 1]
 
         # Default limit
-        return self.max_requests
+        return self._default_rule
+
+    async def _check_rate_limit_redis(self, client_id: str, rule: RateLimitRule) -> Optional[Tuple[bool, int]]:
+        """Token bucket check against shared Redis state
+
+        Enforces the same limit and capacity as _check_and_record. Returns
+        None if Redis is unavailable so the caller can fall back to the
+        in-process buckets; after a failure Redis is not retried until the
+        cooldown has passed.
+        """
+        if self._redis_down and time.monotonic() < self._redis_retry_at:
+            return None
+
+        rate = rule.limit / self.window_size
+        # Expire an idle bucket once it would have refilled completely
+        ttl = math.ceil(rule.capacity / rate) + 1
+
+        try:
+            allowed, remaining = await self._redis_bucket(
+                keys=[f"rl:{client_id}:{rule.key}"],
+                args=[rule.capacity, rate, ttl]
+            )
+        except Exception as e:
+            # Log once per outage rather than on every retry
+            if not self._redis_down:
+                logger.warning(f"Redis rate limit check failed, using in-process limits: {e}")
+            self._redis_down = True
+            self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_COOLDOWN
+            return None
+
+        if self._redis_down:
+            logger.info("Redis rate limit storage recovered")
+            self._redis_down = False
+
+        return bool(allowed), int(remaining)
+
+    def _check_and_record(self, client_id: str, rule: RateLimitRule, now: float) -> Tuple[bool, int]:
+        """Refill the client's bucket for this rule and consume a token if one is available
+
+        Returns (allowed, remaining) with a single bucket lookup.
+        """
+        key = (client_id, rule.key)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(rule.capacity), now]
+
+            # Evict least recently seen buckets - they would be full again anyway
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
 
-    def _check_rate_limit(self, client_id: str, rate_limit: int) -> bool:
-        """Check if client has exceeded rate limit"""
-        now = time.time()
-        window_start = now - self.window_size
+            # Refill at rule.limit tokens per window
+            rate = rule.limit / self.window_size
+            bucket[0] = min(rule.capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
 
-        # Get client's request history
-        client_requests = self.requests[client_id]
+        if bucket[0] < 1.0:
+            return False, 0
 
-        # Remove old requests outside the window
-        while client_requests and client_requests[0] < window_start:
-            client_requests.popleft()
+        bucket[0] -= 1
+        return True, int(bucket[0])
 
-        # Check if under rate limit
-        return len(client_requests) < rate_limit
+    async def _send_rate_limited(self, scope: Scope, send: Send, client_id: str, rate_limit: int, remaining: int):
+        """Send a 429 JSON response directly as raw ASGI messages
 
-    def _record_request(self, client_id: str):
-        """Record a new request for the client"""
-        now = time.time()
-        self.requests[client_id].append(now)
+        LoggingMiddleware sits inside this middleware and never sees the
+        rejection, so it is logged and tagged with a request ID here.
+        """
+        # Reset time is reported as wall-clock epoch seconds
+        reset_time = int(time.time()) + self.window_size
+        request_id = new_request_id()
 
-    def _get_remaining_requests(self, client_id: str, rate_limit: int) -> int:
-        """Get remaining requests for client"""
-        now = time.time()
-        window_start = now - self.window_size
-
-        # Get client's request history
-        client_requests = self.requests[client_id]
-
-        # Count requests in current window
-        current_requests = sum(1 for req_time in client_requests if req_time >= window_start)
-
-        return max(0, rate_limit - current_requests)
-
-    def _rate_limit_response(self, client_id: str, rate_limit: int) -> JSONResponse:
-        """Return rate limit exceeded response"""
-        now = time.time()
-        reset_time = int(now + self.window_size)
-        remaining = self._get_remaining_requests(client_id, rate_limit)
-
-        logger.warning(f"Rate limit exceeded for client: {client_id}")
-
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": True,
-                "message": "Rate limit exceeded. Please try again later.",
-                "status_code": 429,
-                "details": {
-                    "limit": rate_limit,
-                    "remaining": remaining,
-                    "reset_time": reset_time,
-                    "retry_after": self.window_size
-                }
-            },
-            headers={
-                "X-Rate-Limit-Limit": str(rate_limit),
-                "X-Rate-Limit-Remaining": str(remaining),
-                "X-Rate-Limit-Reset": str(reset_time),
-                "Retry-After": str(self.window_size)
-            }
+        logger.warning(
+            f"[{request_id}] {scope['method']} {scope['path']} - 429 rate limit exceeded for client: {client_id}"
         )
 
-    def _start_cleanup_task(self):
-        """Start background task to clean up old request records"""
-        if not self._cleanup_task or self._cleanup_task.done():
-            self._cleanup_task = asyncio.create_task(self._cleanup_old_records())
-
-    async def _cleanup_old_records(self):
-        """Background task to clean up old request records"""
-        while True:
-            try:
-                await asyncio.sleep(300)  # Run every 5 minutes
-
-                now = time.time()
-                window_start = now - self.window_size
-
-                # Clean up old records
-                clients_to_remove = []
-                for client_id, requests in self.requests.items():
-                    # Remove old requests
-                    while requests and requests[0] < window_start:
-                        requests.popleft()
-
-                    # Mark empty clients for removal
-                    if not requests:
-                        clients_to_remove.append(client_id)
-
-                # Remove empty clients
-                for client_id in clients_to_remove:
-                    del self.requests[client_id]
-
-                if clients_to_remove:
-                    logger.debug(f"Cleaned up {len(clients_to_remove)} empty rate limit records")
-
-            except Exception as e:
-                logger.error(f"Error in rate limit cleanup task: {e}")
-                await asyncio.sleep(60)  # Wait a bit before retrying
+        body = json.dumps({
+            "error": True,
+            "message": "Rate limit exceeded. Please try again later.",
+            "status_code": 429,
+            "details": {
+                "limit": rate_limit,
+                "remaining": remaining,
+                "reset_time": reset_time,
+                "retry_after": self.window_size
+            }
+        }).encode()
+
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-rate-limit-limit", str(rate_limit).encode()),
+                (b"x-rate-limit-remaining", str(remaining).encode()),
+                (b"x-rate-limit-reset", str(reset_time).encode()),
+                (b"retry-after", str(self.window_size).encode()),
+                (b"x-request-id", request_id.encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class WindowCounter:
+    """Sliding window of request timestamps with a running count"""
+
+    __slots__ = ("timestamps", "count")
+
+    def __init__(self):
+        self.timestamps: Deque[float] = deque()
+        self.count = 0
+
+    def evict(self, window_start: float):
+        """Drop timestamps older than the window, keeping the count in step"""
+        timestamps = self.timestamps
+        while timestamps and timestamps[0] < window_start:
+            timestamps.popleft()
+            self.count -= 1
+
+    def add(self, now: float):
+        """Record a request"""
+        self.timestamps.append(now)
+        self.count += 1
 
 class RateLimiter:
     """Standalone rate limiter for specific use cases"""
@@ -208,37 +341,30 @@ class RateLimiter:
     def __init__(self, max_requests: int = 60, window_size: int = 60):
         self.max_requests = max_requests
         self.window_size = window_size
-        self.requests: Dict[str, Deque[float]] = defaultdict(deque)
+        self.requests: Dict[str, WindowCounter] = defaultdict(WindowCounter)
 
     def is_allowed(self, client_id: str) -> bool:
         """Check if request is allowed for client"""
-        now = time.time()
-        window_start = now - self.window_size
-
-        # Get client's request history
-        client_requests = self.requests[client_id]
+        now = time.monotonic()
 
-        # Remove old requests
-        while client_requests and client_requests[0] < window_start:
-            client_requests.popleft()
+        # Get client's request history and remove old requests
+        counter = self.requests[client_id]
+        counter.evict(now - self.window_size)
 
         # Check rate limit
-        if len(client_requests) >= self.max_requests:
+        if counter.count >= self.max_requests:
             return False
 
         # Record request
-        client_requests.append(now)
+        counter.add(now)
         return True
 
     def get_remaining(self, client_id: str) -> int:
         """Get remaining requests for client"""
-        now = time.time()
-        window_start = now - self.window_size
-
-        client_requests = self.requests[client_id]
-        current_requests = sum(1 for req_time in client_requests if req_time >= window_start)
+        counter = self.requests[client_id]
+        counter.evict(time.monotonic() - self.window_size)
 
-        return max(0, self.max_requests - current_requests)
+        return max(0, self.max_requests - counter.count)
 
 # Global rate limiter instances for specific use cases
 market_data_limiter = RateLimiter(max_requests=30, window_size=60)  # 30 requests per minute
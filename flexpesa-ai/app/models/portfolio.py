@@ -1,9 +1,53 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index
-from sqlalchemy.orm import relationship
-from app.core.database import Base
-from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index, select, func, text, or_
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship, column_property
+from app.core.database import Base, utcnow, minutes_ago
+from datetime import datetime, timedelta
+from operator import attrgetter
+import numpy as np
 import uuid
 
+# Fields exposed by each model's to_dict(); the timestamp fields are
+# returned as ISO 8601 strings so the dicts stay plain-JSON serializable
+_ACCOUNT_FIELDS = (
+    'id', 'clerk_user_id', 'name', 'account_type', 'balance', 'description',
+    'currency', 'is_active', 'created_at', 'updated_at', 'total_value', 'asset_count'
+)
+_ASSET_FIELDS = (
+    'id', 'account_id', 'symbol', 'name', 'asset_type', 'shares', 'avg_cost',
+    'current_price', 'market_value', 'cost_basis', 'unrealized_pnl',
+    'unrealized_pnl_percent', 'market_cap', 'volume', 'day_change',
+    'day_change_percent', 'currency', 'exchange', 'sector', 'industry',
+    'is_active', 'created_at', 'last_updated', 'price_updated_at'
+)
+_SNAPSHOT_FIELDS = (
+    'id', 'clerk_user_id', 'total_value', 'total_cost_basis', 'total_pnl',
+    'total_pnl_percent', 'asset_count', 'account_count', 'snapshot_type', 'created_at'
+)
+_MARKET_DATA_FIELDS = (
+    'symbol', 'name', 'current_price', 'open_price', 'high_price', 'low_price',
+    'volume', 'day_change', 'day_change_percent', 'market_cap', 'sector',
+    'industry', 'currency', 'exchange', 'asset_type', 'updated_at'
+)
+
+_get_account_fields = attrgetter(*_ACCOUNT_FIELDS)
+_get_asset_fields = attrgetter(*_ASSET_FIELDS)
+_get_snapshot_fields = attrgetter(*_SNAPSHOT_FIELDS)
+_get_market_data_fields = attrgetter(*_MARKET_DATA_FIELDS)
+
+_ACCOUNT_TIMESTAMPS = ('created_at', 'updated_at')
+_ASSET_TIMESTAMPS = ('created_at', 'last_updated', 'price_updated_at')
+_SNAPSHOT_TIMESTAMPS = ('created_at',)
+_MARKET_DATA_TIMESTAMPS = ('updated_at',)
+
+def _fields_to_dict(fields, values, timestamps):
+    """Zip field names with values, formatting the timestamp fields"""
+    data = dict(zip(fields, values))
+    for name in timestamps:
+        value = data[name]
+        data[name] = value.isoformat() if value else None
+    return data
+
 class Account(Base):
     __tablename__ = "accounts"
 
@@ -22,43 +66,39 @@ class Account(Base):
     is_active = Column(Boolean, default=True)
 
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow(), nullable=False)
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     # Relationships
     assets = relationship("Asset", back_populates="account", cascade="all, delete-orphan")
 
     # Indexes for better query performance
     __table_args__ = (
-        Index('idx_account_user_active', 'clerk_user_id', 'is_active'),
+        # Partial covering index: dashboards only ever read active accounts
+        Index(
+            'idx_account_user_active', 'clerk_user_id',
+            postgresql_where=text('is_active = true'),
+            postgresql_include=['id', 'name', 'account_type', 'balance']
+        ),
         Index('idx_account_type', 'account_type'),
     )
 
     def __repr__(self):
         return f"<Account(id={self.id}, name='{self.name}', type='{self.account_type}')>"
 
-    @property
-    def total_value(self):
-        """Calculate total account value from assets"""
-        return sum(
-            (asset.shares * (asset.current_price or asset.avg_cost)) for asset in self.assets if asset.is_active)
+    @classmethod
+    def totals_for_user(cls, db, clerk_user_id: str):
+        """(account_id, total_value) for each active account of a user in one aggregate query"""
+        return db.execute(
+            select(cls.id, func.coalesce(func.sum(_asset_market_value), 0.0))
+            .outerjoin(Asset, (Asset.account_id == cls.id) & (Asset.is_active == True))  # noqa: E712
+            .where(cls.clerk_user_id == clerk_user_id, cls.is_active == True)  # noqa: E712
+            .group_by(cls.id)
+        ).all()
 
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
-        return {
-            "id": self.id,
-            "clerk_user_id": self.clerk_user_id,
-            "name": self.name,
-            "account_type": self.account_type,
-            "balance": self.balance,
-            "description": self.description,
-            "currency": self.currency,
-            "is_active": self.is_active,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "total_value": self.total_value,
-            "asset_count": len(self.assets)
-        }
+        return _fields_to_dict(_ACCOUNT_FIELDS, _get_account_fields(self), _ACCOUNT_TIMESTAMPS)
 
 class Asset(Base):
     __tablename__ = "assets"
@@ -92,8 +132,8 @@ class Asset(Base):
     is_active = Column(Boolean, default=True)
 
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow(), nullable=False)
+    last_updated = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
     price_updated_at = Column(DateTime, nullable=True)
 
     # Relationships
@@ -103,7 +143,11 @@ class Asset(Base):
     __table_args__ = (
         Index('idx_asset_symbol', 'symbol'),
         Index('idx_asset_account_symbol', 'account_id', 'symbol'),
-        Index('idx_asset_account_active', 'account_id', 'is_active'),
+        Index(
+            'idx_asset_account_active', 'account_id',
+            postgresql_where=text('is_active = true'),
+            postgresql_include=['symbol', 'shares', 'avg_cost', 'current_price']
+        ),
         Index('idx_asset_type', 'asset_type'),
     )
 
@@ -132,34 +176,56 @@ class Asset(Base):
             return 0.0
         return (self.unrealized_pnl / self.cost_basis) * 100
 
+    @classmethod
+    def compute_bulk(cls, assets):
+        """
+        Vectorized market_value, cost_basis, unrealized_pnl and
+        unrealized_pnl_percent for many assets at once (one array per field)
+        """
+        count = len(assets)
+        shares = np.fromiter((a.shares for a in assets), dtype=float, count=count)
+        prices = np.fromiter((a.current_price or a.avg_cost for a in assets), dtype=float, count=count)
+        avg_costs = np.fromiter((a.avg_cost for a in assets), dtype=float, count=count)
+
+        market_values = shares * prices
+        cost_bases = shares * avg_costs
+        pnls = market_values - cost_bases
+        pnl_percents = np.divide(
+            pnls * 100, cost_bases,
+            out=np.zeros_like(pnls), where=cost_bases != 0
+        )
+        return market_values, cost_bases, pnls, pnl_percents
+
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
-        return {
-            "id": self.id,
-            "account_id": self.account_id,
-            "symbol": self.symbol,
-            "name": self.name,
-            "asset_type": self.asset_type,
-            "shares": self.shares,
-            "avg_cost": self.avg_cost,
-            "current_price": self.current_price,
-            "market_value": self.market_value,
-            "cost_basis": self.cost_basis,
-            "unrealized_pnl": self.unrealized_pnl,
-            "unrealized_pnl_percent": self.unrealized_pnl_percent,
-            "market_cap": self.market_cap,
-            "volume": self.volume,
-            "day_change": self.day_change,
-            "day_change_percent": self.day_change_percent,
-            "currency": self.currency,
-            "exchange": self.exchange,
-            "sector": self.sector,
-            "industry": self.industry,
-            "is_active": self.is_active,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "last_updated": self.last_updated.isoformat() if self.last_updated else None,
-            "price_updated_at": self.price_updated_at.isoformat() if self.price_updated_at else None
-        }
+        return _fields_to_dict(_ASSET_FIELDS, _get_asset_fields(self), _ASSET_TIMESTAMPS)
+
+# Number of assets (active or not) on the account, without loading them.
+# Deferred so ordinary account loads skip the subquery; undefer() where read
+Account.asset_count = column_property(
+    select(func.count(Asset.id))
+    .where(Asset.account_id == Account.id)
+    .correlate_except(Asset)
+    .scalar_subquery(),
+    deferred=True
+)
+
+# Market value of a position in SQL: current_price, falling back to avg_cost
+# when the price is missing or zero (mirrors Asset.market_value)
+_asset_market_value = Asset.shares * func.coalesce(func.nullif(Asset.current_price, 0), Asset.avg_cost)
+
+# Total account value from active assets, computed by the database as part of
+# the account SELECT instead of loading every asset row. "== True" renders
+# "is_active = true", which the partial index predicates match; IS TRUE does not.
+# Deferred like asset_count, and loaded once per identity: expire it after
+# changing the account's assets
+Account.total_value = column_property(
+    select(func.coalesce(func.sum(_asset_market_value), 0.0))
+    .where(Asset.account_id == Account.id, Asset.is_active == True)  # noqa: E712
+    .correlate_except(Asset)
+    .scalar_subquery(),
+    deferred=True
+)
 
 class PortfolioSnapshot(Base):
     """Table to store historical portfolio snapshots for performance tracking"""
@@ -180,28 +246,20 @@ class PortfolioSnapshot(Base):
 
     # Snapshot metadata
     snapshot_type = Column(String(20), default="daily")  # daily, weekly, monthly
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, server_default=utcnow(), nullable=False)
 
     # Indexes
     __table_args__ = (
         Index('idx_snapshot_user_date', 'clerk_user_id', 'created_at'),
+        # Snapshots are append-only, so created_at follows physical row order
+        # and a tiny BRIN index serves history range scans
+        Index('idx_snapshot_created_brin', 'created_at', postgresql_using='brin'),
         Index('idx_snapshot_type', 'snapshot_type'),
     )
 
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
-        return {
-            "id": self.id,
-            "clerk_user_id": self.clerk_user_id,
-            "total_value": self.total_value,
-            "total_cost_basis": self.total_cost_basis,
-            "total_pnl": self.total_pnl,
-            "total_pnl_percent": self.total_pnl_percent,
-            "asset_count": self.asset_count,
-            "account_count": self.account_count,
-            "snapshot_type": self.snapshot_type,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
+        return _fields_to_dict(_SNAPSHOT_FIELDS, _get_snapshot_fields(self), _SNAPSHOT_TIMESTAMPS)
 
 class MarketData(Base):
     """Table to cache market data to reduce API calls"""
@@ -233,8 +291,8 @@ class MarketData(Base):
     asset_type = Column(String(50), nullable=True)
 
     # Cache timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow(), nullable=False)
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     # Indexes
     __table_args__ = (
@@ -242,32 +300,32 @@ class MarketData(Base):
         Index('idx_market_data_type', 'asset_type'),
     )
 
-    @property
-    def is_stale(self, max_age_minutes: int = 5) -> bool:
+    STALE_AFTER_MINUTES = 5
+
+    @hybrid_property
+    def is_stale(self) -> bool:
         """Check if market data is stale"""
         if not self.updated_at:
             return True
 
         age = datetime.utcnow() - self.updated_at
-        return age.total_seconds() > (max_age_minutes * 60)
+        return age > timedelta(minutes=self.STALE_AFTER_MINUTES)
+
+    @is_stale.expression
+    def is_stale(cls):
+        """SQL form of is_stale, usable in query filters"""
+        return cls._older_than(cls.STALE_AFTER_MINUTES)
+
+    @classmethod
+    def _older_than(cls, max_age_minutes: int):
+        """SQL staleness predicate, aged by the database clock that sets updated_at"""
+        return or_(cls.updated_at.is_(None), cls.updated_at < minutes_ago(max_age_minutes))
+
+    @classmethod
+    def stale_symbols(cls, db, max_age_minutes: int = STALE_AFTER_MINUTES) -> list:
+        """Symbols whose cached data is older than max_age_minutes, filtered in SQL"""
+        return db.scalars(select(cls.symbol).where(cls._older_than(max_age_minutes))).all()
 
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
-        return {
-            "symbol": self.symbol,
-            "name": self.name,
-            "current_price": self.current_price,
-            "open_price": self.open_price,
-            "high_price": self.high_price,
-            "low_price": self.low_price,
-            "volume": self.volume,
-            "day_change": self.day_change,
-            "day_change_percent": self.day_change_percent,
-            "market_cap": self.market_cap,
-            "sector": self.sector,
-            "industry": self.industry,
-            "currency": self.currency,
-            "exchange": self.exchange,
-            "asset_type": self.asset_type,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
+        return _fields_to_dict(_MARKET_DATA_FIELDS, _get_market_data_fields(self), _MARKET_DATA_TIMESTAMPS)
@@ -15,5 +15,5 @@ class User(SQLAlchemyBaseUserTableUUID, Base):
     is_premium = Column(Boolean, default=False)
 
     # Relationship to accounts
-    accounts = relationship("Account", back_populates="user")
+    accounts = relationship("Account", back_populates="user", lazy="selectin")
     
\ No newline at end of file
@@ -1,8 +1,35 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import List, Optional, Any
 from datetime import datetime
+from math import fsum
 import re
 
+# Valid symbol characters: letters, numbers, hyphens (crypto) and dots (share classes)
+_SYMBOL_RE = re.compile(r'[A-Z0-9\-\.]+')
+# Order symbols do not allow dots
+_ORDER_SYMBOL_RE = re.compile(r'[A-Z0-9\-]+')
+
+_VALID_ACCOUNT_TYPES = frozenset({
+    'brokerage', 'retirement', 'ira', 'roth_ira', '401k',
+    'trading', 'investment', 'savings', 'crypto', 'testing'
+})
+_VALID_ACCOUNT_TYPES_STR = ', '.join(sorted(_VALID_ACCOUNT_TYPES))
+
+_VALID_ORDER_TYPES = frozenset({'buy', 'sell', 'buy_to_cover', 'sell_short'})
+_VALID_ORDER_TYPES_STR = ', '.join(sorted(_VALID_ORDER_TYPES))
+
+_VALID_RISK_LEVELS = frozenset({'conservative', 'moderate', 'aggressive'})
+_VALID_RISK_LEVELS_STR = ', '.join(sorted(_VALID_RISK_LEVELS))
+
+_VALID_HOLDING_PERIODS = frozenset({'short_term', 'long_term'})
+
+def _normalize_currency(v: str) -> str:
+    """Upper-case a currency code and require exactly 3 ASCII letters"""
+    currency = v.strip().upper()
+    if len(currency) != 3 or not (currency.isascii() and currency.isalpha()):
+        raise ValueError("Currency code must be exactly 3 letters")
+    return currency
+
 class AssetBase(BaseModel):
     symbol: str = Field(..., min_length=1, max_length=20, description="Asset symbol (e.g., AAPL, BTC-USD)")
     shares: float = Field(..., gt=0, description="Number of shares (must be positive)")
@@ -11,11 +38,8 @@ class AssetBase(BaseModel):
     @field_validator('symbol')
     @classmethod
     def validate_symbol(cls, v: str) -> str:
-        if v is None:
-            raise ValueError("Symbol is required")
-
         # Strip whitespace first
-        symbol = str(v).strip()
+        symbol = v.strip()
 
         # Check for empty after stripping
         if not symbol:
@@ -25,42 +49,14 @@ class AssetBase(BaseModel):
         symbol = symbol.upper()
 
         # Check for valid characters (letters, numbers, and hyphens for crypto)
-        if not re.match(r'^[A-Z0-9\-\.]+$', symbol):
+        if not _SYMBOL_RE.fullmatch(symbol):
             raise ValueError("Symbol contains invalid characters")
 
         return symbol
 
-    @field_validator('shares')
-    @classmethod
-    def validate_shares(cls, v: float) -> float:
-        if v is None:
-            raise ValueError("Shares is required")
-
-        if v <= 0:
-            raise ValueError("Shares must be greater than 0")
-        return v
-
-    @field_validator('avg_cost')
-    @classmethod
-    def validate_avg_cost(cls, v: float) -> float:
-        if v is None:
-            raise ValueError("Average cost is required")
-        if v < 0:
-            raise ValueError("Average cost cannot be negative")
-        return v
-
 class AssetCreateRequest(AssetBase):
     account_id: int = Field(..., gt=0, description="Account ID this asset belongs to")
 
-    @field_validator('account_id')
-    @classmethod
-    def validate_account_id(cls, v: int) -> int:
-        if v is None:
-            raise ValueError("Account ID is required")
-        if v <= 0:
-            raise ValueError("Account ID must be greater than 0")
-        return v
-
 class Asset(AssetBase):
     id: int
     account_id: int
@@ -77,10 +73,7 @@ class AccountBase(BaseModel):
     @field_validator('name')
     @classmethod
     def validate_name(cls, v: str) -> str:
-        if v is None:
-            raise ValueError("Account name is required")
-
-        name = str(v).strip()
+        name = v.strip()
 
         if not name:
             raise ValueError("Account name cannot be empty")
@@ -89,12 +82,8 @@ class AccountBase(BaseModel):
     @field_validator('account_type')
     @classmethod
     def validate_account_type(cls, v: str) -> str:
-        # Handle None explicitly
-        if v is None:
-            raise ValueError("Account type is required")
-
-        # Convert to string and strip
-        account_type = str(v).strip()
+        # Strip surrounding whitespace
+        account_type = v.strip()
 
         # Check for empty after stripping
         if not account_type:
@@ -103,14 +92,8 @@ class AccountBase(BaseModel):
         # Normalize to lowercase
         account_type = account_type.lower()
 
-        # Valid account types
-        valid_types = {
-            'brokerage', 'retirement', 'ira', 'roth_ira', '401k',
-            'trading', 'investment', 'savings', 'crypto', 'testing'
-        }
-
-        if account_type not in valid_types:
-            raise ValueError(f"Account type must be one of: {', '.join(sorted(valid_types))}")
+        if account_type not in _VALID_ACCOUNT_TYPES:
+            raise ValueError(f"Account type must be one of: {_VALID_ACCOUNT_TYPES_STR}")
 
         return account_type
 
@@ -122,17 +105,14 @@ class AccountCreateRequest(AccountBase):
     @classmethod
     def validate_currency(cls, v: Optional[str]) -> str:
         if v:
-            currency = str(v).strip().upper()
-            if len(currency) != 3:
-                raise ValueError("Currency code must be exactly 3 characters")
-            return currency
+            return _normalize_currency(v)
         return "USD"
 
 class Account(AccountBase):
     id: int
     balance: float
     created_at: datetime
-    assets: List[Asset] = []
+    assets: List[Asset] = Field(default_factory=list)
 
     class Config:
         from_attributes = True
@@ -154,12 +134,12 @@ class BulkAssetCreateRequest(BaseModel):
     @field_validator('assets')
     @classmethod
     def validate_unique_symbols(cls, v: List[AssetBase]) -> List[AssetBase]:
-        if not v:
-            raise ValueError("At least one asset is required")
-
-        symbols = [asset.symbol.upper() for asset in v]
-        if len(symbols) != len(set(symbols)):
-            raise ValueError("Duplicate symbols are not allowed in bulk creation")
+        # Symbols are already upper-cased by AssetBase; stop at the first repeat
+        seen = set()
+        for asset in v:
+            if asset.symbol in seen:
+                raise ValueError("Duplicate symbols are not allowed in bulk creation")
+            seen.add(asset.symbol)
         return v
 
 class AssetUpdate(BaseModel):
@@ -191,7 +171,7 @@ class AssetUpdate(BaseModel):
 
     @model_validator(mode='after')
     def validate_at_least_one_field(self) -> 'AssetUpdate':
-        if not any([self.shares, self.avg_cost, self.current_price]):
+        if self.shares is None and self.avg_cost is None and self.current_price is None:
             raise ValueError("At least one field must be provided for update")
         return self
 
@@ -204,8 +184,8 @@ class AccountUpdate(BaseModel):
     @classmethod
     def validate_name(cls, v: Optional[str]) -> Optional[str]:
         if v is not None:
-            # Convert to string and strip
-            name = str(v).strip()
+            # Strip surrounding whitespace
+            name = v.strip()
             # Check for empty after stripping
             if not name:
                 raise ValueError("Account name cannot be empty")
@@ -292,7 +272,7 @@ class MarketOrderData(BaseModel):
             raise ValueError("Symbol cannot be empty")
 
         symbol = v.strip().upper()
-        if not re.match(r'^[A-Z0-9\-]+$', symbol):
+        if not _ORDER_SYMBOL_RE.fullmatch(symbol):
             raise ValueError("Symbol contains invalid characters")
         return symbol
 
@@ -302,10 +282,9 @@ class MarketOrderData(BaseModel):
         if not v or not v.strip():
             raise ValueError("Order type cannot be empty")
 
-        valid_types = {'buy', 'sell', 'buy_to_cover', 'sell_short'}
         order_type = v.lower().strip()
-        if order_type not in valid_types:
-            raise ValueError(f"Order type must be one of: {', '.join(valid_types)}")
+        if order_type not in _VALID_ORDER_TYPES:
+            raise ValueError(f"Order type must be one of: {_VALID_ORDER_TYPES_STR}")
         return order_type
 
 # Advanced portfolio analytics models
@@ -336,16 +315,15 @@ class RiskAssessment(BaseModel):
         if not v or not v.strip():
             raise ValueError("Risk level cannot be empty")
 
-        valid_levels = {'conservative', 'moderate', 'aggressive'}
         risk_level = v.lower().strip()
-        if risk_level not in valid_levels:
-            raise ValueError(f"Risk level must be one of: {', '.join(valid_levels)}")
+        if risk_level not in _VALID_RISK_LEVELS:
+            raise ValueError(f"Risk level must be one of: {_VALID_RISK_LEVELS_STR}")
         return risk_level
 
     @model_validator(mode='after')
     def validate_sector_exposure(self) -> 'RiskAssessment':
         if self.sector_exposure:
-            total_exposure = sum(self.sector_exposure.values())
+            total_exposure = fsum(self.sector_exposure.values())
             if abs(total_exposure - 100.0) > 0.01:  # Allow for minor rounding differences
                 raise ValueError("Sector exposure percentages must sum to 100%")
         return self
@@ -372,9 +350,8 @@ class TaxLotData(BaseModel):
         if not v or not v.strip():
             raise ValueError("Holding period cannot be empty")
 
-        valid_periods = {'short_term', 'long_term'}
         period = v.lower().strip()
-        if period not in valid_periods:
+        if period not in _VALID_HOLDING_PERIODS:
             raise ValueError("Holding period must be 'short_term' or 'long_term'")
         return period
 
@@ -389,15 +366,7 @@ class CurrencyConversion(BaseModel):
     @field_validator('base_currency', 'target_currency')
     @classmethod
     def validate_currency_codes(cls, v: str) -> str:
-        if not v or not v.strip():
-            raise ValueError("Currency code cannot be empty")
-
-        currency = v.upper().strip()
-        if len(currency) != 3:
-            raise ValueError("Currency code must be exactly 3 characters")
-        if not currency.isalpha():
-            raise ValueError("Currency code must contain only letters")
-        return currency
+        return _normalize_currency(v)
 
     @model_validator(mode='after')
     def validate_different_currencies(self) -> 'CurrencyConversion':
@@ -4,12 +4,89 @@ import requests
 import logging
 import asyncio
 import aiohttp
+import orjson
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import json
 import re
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 
+# Process-wide TTL caches (the service is instantiated per request).
+# News moves quickly; daily bars only change once per session.
+_NEWS_CACHE_TTL = 300
+_HISTORY_CACHE_TTL = 900
+_CACHE_MAX_SIZE = 512
+
+_news_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_history_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+# Shared NewsAPI session so connections (TCP + TLS) are reused across requests
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def _get_http_session() -> aiohttp.ClientSession:
+    """Get (or lazily create) the shared aiohttp session"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=5),  # Fast timeout
+            connector=aiohttp.TCPConnector(limit=32, limit_per_host=5, ttl_dns_cache=300)
+        )
+    return _http_session
+
+async def close_http_session():
+    """Close the shared aiohttp session (call on application shutdown)"""
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+class AsyncTokenBucket:
+    """Async token bucket: paces calls to `rate` per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available, then take it"""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# NewsAPI pacing: 90 requests per minute, with exponential backoff on 429. The
+# burst is kept small so a cold start spreads requests out rather than sending
+# a minute's worth at once and tripping the 429s the backoff then retries
+_news_limiter = AsyncTokenBucket(rate=90 / 60, capacity=3)
+_NEWS_MAX_RETRIES = 2
+_NEWS_BACKOFF_BASE = 0.5
+
+def _cache_get(cache: OrderedDict, key: tuple, now: float):
+    """Return the cached value for key if it has not expired"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at <= now:
+        cache.pop(key, None)
+        return None
+    return value
+
+def _cache_put(cache: OrderedDict, key: tuple, value, ttl: float, now: float):
+    """Cache value for ttl seconds, evicting the oldest entry when full"""
+    cache.pop(key, None)
+    if len(cache) >= _CACHE_MAX_SIZE:
+        cache.popitem(last=False)
+    cache[key] = (now + ttl, value)
+
 @dataclass
 class TechnicalIndicators:
     """Lightweight technical indicators"""
@@ -105,73 +182,140 @@ class LightweightAIService:
         """Get basic technical indicators using only pandas/numpy"""
         technical_data = {}
 
-        # Use yfinance (already in dependencies) for price data
-        import yfinance as yf
+        # Reuse recently fetched daily bars
+        now = time.monotonic()
+        closes = {}
+        for symbol in symbols:
+            cached = _cache_get(_history_cache, (symbol, "3mo"), now)
+            if cached is not None:
+                closes[symbol] = cached
+        to_fetch = [symbol for symbol in symbols if symbol not in closes]
+
+        # One multi-ticker request instead of one round-trip per symbol;
+        # yfinance is blocking, so keep it off the event loop
+        if to_fetch:
+            closes.update(await asyncio.to_thread(self._download_closes_batch, to_fetch))
+
+        # Fall back to concurrent single-ticker requests for symbols the batch missed
+        missing = [symbol for symbol in symbols if closes.get(symbol) is None or closes[symbol].empty]
+        if missing:
+            semaphore = asyncio.Semaphore(8)
+
+            async def fetch_history(symbol):
+                async with semaphore:
+                    return await asyncio.to_thread(self._fetch_closes_single, symbol)
+
+            results = await asyncio.gather(*(fetch_history(s) for s in missing), return_exceptions=True)
+            for symbol, result in zip(missing, results):
+                if isinstance(result, Exception):
+                    self.logger.warning(f"Price history fetch failed for {symbol}: {result}")
+                else:
+                    closes[symbol] = result
+
+        now = time.monotonic()
+        for symbol in to_fetch:
+            if closes.get(symbol) is not None and not closes[symbol].empty:
+                _cache_put(_history_cache, (symbol, "3mo"), closes[symbol], _HISTORY_CACHE_TTL, now)
 
         for symbol in symbols:
             try:
-                # Get minimal data needed (faster)
-                ticker = yf.Ticker(symbol)
-                hist = ticker.history(period="3mo", interval="1d")  # Reduced period for speed
+                close_prices = closes.get(symbol)
 
-                if hist.empty or len(hist) < 20:
+                if close_prices is None or len(close_prices) < 20:
                     technical_data[symbol] = self._get_default_technical()
                     continue
 
-                close_prices = hist['Close']
+                technical_data[symbol] = self._compute_indicators(close_prices)
 
-                # Calculate only essential indicators (fast operations)
-                # RSI (simplified calculation)
-                rsi = self._calculate_simple_rsi(close_prices, period=14)
+            except Exception as e:
+                self.logger.warning(f"Technical analysis failed for {symbol}: {e}")
+                technical_data[symbol] = self._get_default_technical()
 
-                # Moving averages
-                sma_20 = close_prices.tail(20).mean() if len(close_prices) >= 20 else close_prices.mean()
-                sma_50 = close_prices.tail(50).mean() if len(close_prices) >= 50 else close_prices.mean()
+        return technical_data
 
-                # Volatility (simplified)
-                returns = close_prices.pct_change().dropna()
-                volatility = returns.std() * np.sqrt(252) if len(returns) > 1 else 0.2
+    def _compute_indicators(self, close_prices) -> TechnicalIndicators:
+        """All technical indicators from one float64 array of closes"""
+        close = np.asarray(close_prices, dtype=np.float64)
+        n = len(close)
+        current_price = close[-1]
 
-                # Momentum (price changes)
-                current_price = close_prices.iloc[-1]
-                momentum = ((current_price / close_prices.iloc[-10]) - 1) * 100 if len(close_prices) >= 10 else 0
-                price_change_5d = ((current_price / close_prices.iloc[-5]) - 1) * 100 if len(close_prices) >= 5 else 0
-                price_change_20d = ((current_price / close_prices.iloc[-20]) - 1) * 100 if len(close_prices) >= 20 else 0
+        # RSI (simplified calculation)
+        rsi = self._calculate_simple_rsi(close, period=14)
 
-                technical_data[symbol] = TechnicalIndicators(
-                    rsi=rsi,
-                    sma_20=sma_20,
-                    sma_50=sma_50,
-                    volatility=volatility,
-                    momentum=momentum,
-                    price_change_5d=price_change_5d,
-                    price_change_20d=price_change_20d
-                )
+        # Moving averages
+        sma_20 = close[-20:].mean()
+        sma_50 = close[-50:].mean()
 
-            except Exception as e:
-                self.logger.warning(f"Technical analysis failed for {symbol}: {e}")
-                technical_data[symbol] = self._get_default_technical()
+        # Volatility (simplified), from daily returns
+        returns = close[1:] / close[:-1] - 1
+        volatility = returns.std(ddof=1) * np.sqrt(252) if n > 2 else 0.2
 
-        return technical_data
+        # Momentum (price changes over fixed lookbacks)
+        def change_over(days):
+            return ((current_price / close[-days]) - 1) * 100 if n >= days else 0.0
+
+        return TechnicalIndicators(
+            rsi=rsi,
+            sma_20=float(sma_20),
+            sma_50=float(sma_50),
+            volatility=float(volatility),
+            momentum=float(change_over(10)),
+            price_change_5d=float(change_over(5)),
+            price_change_20d=float(change_over(20))
+        )
+
+    def _fetch_closes_single(self, symbol: str) -> Optional[pd.Series]:
+        """Daily closes for one symbol (blocking)"""
+        import yfinance as yf
+
+        hist = yf.Ticker(symbol).history(period="3mo", interval="1d")
+        return hist['Close'].dropna() if not hist.empty else None
 
-    def _calculate_simple_rsi(self, prices: pd.Series, period: int = 14) -> float:
+    def _download_closes_batch(self, symbols: List[str]) -> Dict[str, pd.Series]:
+        """Daily closes for all symbols from a single batched yf.download (blocking)"""
+        import yfinance as yf
+
+        try:
+            data = yf.download(
+                symbols, period="3mo", interval="1d", group_by="ticker",
+                auto_adjust=True, threads=True, progress=False
+            )
+        except Exception as e:
+            self.logger.warning(f"Batched price history download failed: {e}")
+            return {}
+
+        if data is None or data.empty:
+            return {}
+
+        closes = {}
+        if isinstance(data.columns, pd.MultiIndex):
+            tickers = set(data.columns.get_level_values(0))
+            for symbol in symbols:
+                if symbol in tickers and 'Close' in data[symbol]:
+                    closes[symbol] = data[symbol]['Close'].dropna()
+        elif len(symbols) == 1 and 'Close' in data:
+            closes[symbols[0]] = data['Close'].dropna()
+
+        return closes
+
+    def _calculate_simple_rsi(self, prices, period: int = 14) -> float:
         """Fast RSI calculation without external libraries"""
         if len(prices) < period + 1:
             return 50.0
 
-        delta = prices.diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
+        # Only the last `period` price changes contribute
+        window = np.asarray(prices, dtype=np.float64)[-(period + 1):]
+        delta = np.diff(window)
 
-        avg_gain = gain.tail(period).mean()
-        avg_loss = loss.tail(period).mean()
+        avg_gain = delta[delta > 0].sum() / period
+        avg_loss = -delta[delta < 0].sum() / period
 
         if avg_loss == 0:
             return 100.0
 
         rs = avg_gain / avg_loss
         rsi = 100 - (100 / (1 + rs))
-        return rsi
+        return float(rsi)
 
     async def _get_basic_sentiment_batch(self, symbols: List[str]) -> Dict[str, SentimentData]:
         """Fast sentiment analysis using pattern patterns"""
@@ -180,14 +324,9 @@ class LightweightAIService:
 
         sentiment_data = {}
 
-        # Use asyncio for concurrent requests but limit to avoid rate limits
-        semaphore = asyncio.Semaphore(3)  # Max 3 concurrent requests
-
-        async def analyze_symbol(symbol):
-            async with semaphore:
-                return await self._get_fast_sentiment(symbol)
-
-        tasks = [analyze_symbol(symbol) for symbol in symbols]
+        # All fetches start at once: the shared session's connector caps open
+        # connections per host, and _fetch_news_fast paces them against NewsAPI's rate limit
+        tasks = [self._get_fast_sentiment(symbol) for symbol in symbols]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         for symbol, result in zip(symbols, results):
@@ -248,6 +387,11 @@ class LightweightAIService:
 
     async def _fetch_news_fast(self, symbol: str, max_articles: int = 10) -> List[Dict]:
         """Fast, minimal news fetching"""
+        cache_key = (symbol, max_articles)
+        cached = _cache_get(_news_cache, cache_key, time.monotonic())
+        if cached is not None:
+            return cached
+
         try:
             url = "https://newsapi.org/v2/everything"
             params = {
@@ -259,16 +403,24 @@ class LightweightAIService:
                 "language": "en"
             }
 
-            timeout = aiohttp.ClientTimeout(total=5)  # Fast timeout
+            for attempt in range(_NEWS_MAX_RETRIES + 1):
+                await _news_limiter.acquire()
 
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url, params=params) as response:
+                async with _get_http_session().get(url, params=params) as response:
                     if response.status == 200:
-                        data = await response.json()
-                        return data.get("articles", [])[:max_articles]
-                    else:
+                        data = await response.json(loads=orjson.loads)
+                        articles = data.get("articles", [])[:max_articles]
+                        _cache_put(_news_cache, cache_key, articles, _NEWS_CACHE_TTL, time.monotonic())
+                        return articles
+                    if response.status != 429:
                         return []
 
+                if attempt < _NEWS_MAX_RETRIES:
+                    await asyncio.sleep(_NEWS_BACKOFF_BASE * 2 ** attempt)
+
+            self.logger.warning(f"News API rate limited for {symbol}")
+            return []
+
         except Exception as e:
             self.logger.warning(f"Fast news fetch failed for {symbol}: {e}")
             return []
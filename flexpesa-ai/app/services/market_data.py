@@ -7,6 +7,7 @@ import logging
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
+from app.core.database import utcnow
 from app.models.portfolio import MarketData
 
 class MarketDataService:
@@ -73,7 +74,7 @@ class MarketDataService:
             if symbol in cached_data:
                 cache_entry = cached_data[symbol]
                 # Check if data is stale (older than 5 minutes)
-                if cache_entry.is_stale(max_age_minutes=5):
+                if cache_entry.is_stale:
                     stale_symbols.append(symbol)
                 else:
                     # Use cached price
@@ -113,15 +114,50 @@ class MarketDataService:
 
         return prices
 
+    def _fetch_batch_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """Fetch latest closes for all symbols with a single batched download"""
+        data = yf.download(
+            symbols, period="5d", interval="1d", group_by="column",
+            auto_adjust=False, threads=True, progress=False
+        )
+        if data is None or data.empty or 'Close' not in data:
+            return {}
+
+        closes = data['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(symbols[0])
+
+        # Last non-missing close per symbol (covers weekends and holidays)
+        latest = closes.ffill().iloc[-1]
+        return {
+            symbol: float(price)
+            for symbol, price in latest.items()
+            if pd.notna(price) and price > 0
+        }
+
     def _fetch_real_prices(self, symbols: List[str]) -> Dict[str, float]:
         """Fetch real prices from Yahoo Finance with rate limiting"""
-        prices = {}
+        self.last_request_time = time.time()
+        try:
+            prices = self._fetch_batch_prices(symbols)
+        except Exception as e:
+            if "429" in str(e) or "Too Many Requests" in str(e):
+                self.logger.warning("   🚫 Rate limited on batch download! Using database fallback")
+                self.last_rate_limit_time = time.time()
+                return {}
+            self.logger.warning(f"   ⚠️  Batch download failed: {e}")
+            prices = {}
+
+        for symbol, price in prices.items():
+            self.logger.info(f"   ✅ {symbol}: ${price:,.2f}")
+
+        # Fall back to per-symbol lookups only for symbols the batch missed
+        remaining = [symbol for symbol in symbols if symbol not in prices]
 
-        for i, symbol in enumerate(symbols):
+        for symbol in remaining:
             try:
-                # Rate limit all requests except the first
-                if i > 0:
-                    self._enforce_rate_limit()
+                # Space out follow-up requests after the batch download
+                self._enforce_rate_limit()
 
                 self.logger.info(f"   Getting {symbol}...")
                 price = self._get_single_price_safe(symbol)
@@ -203,7 +239,9 @@ class MarketDataService:
                 market_data.current_price = price
                 market_data.day_change = day_change
                 market_data.day_change_percent = day_change_percent
-                market_data.updated_at = datetime.utcnow()
+                # Set explicitly: onupdate only fires when another column changed,
+                # and an unchanged price must still refresh the staleness clock
+                market_data.updated_at = utcnow()
             else:
                 # Create new entry with basic info
                 market_data = MarketData(
@@ -211,9 +249,7 @@ class MarketDataService:
                     name=self._get_symbol_name(symbol),
                     current_price=price,
                     asset_type=self._determine_asset_type(symbol),
-                    currency="USD",
-                    created_at=datetime.utcnow(),
-                    updated_at=datetime.utcnow()
+                    currency="USD"
                 )
                 self.db.add(market_data)
 
@@ -310,10 +346,7 @@ class MarketDataService:
         try:
             if not symbols:
                 # Get all symbols that need updating
-                stale_entries = self.db.query(MarketData).filter(
-                    MarketData.updated_at < datetime.utcnow() - timedelta(minutes=5)
-                ).all()
-                symbols = [entry.symbol for entry in stale_entries]
+                symbols = MarketData.stale_symbols(self.db)
 
             if not symbols:
                 return {"message": "No symbols need updating"}
@@ -166,10 +166,13 @@ class DatabasePerformanceCalculator:
         if risk_free_rate is None:
             risk_free_rate = self.risk_free_rate
 
-        avg_return = statistics.mean(returns)
-        volatility = statistics.stdev(returns)
+        # Vectorized mean/sample stdev in one pass over a float array
+        returns_arr = np.asarray(returns, dtype=np.float64)
+        avg_return = float(returns_arr.mean())
+        volatility = float(returns_arr.std(ddof=1))
 
-        if volatility == 0:
+        # Constant returns can leave float rounding noise instead of an exact zero
+        if volatility < 1e-12:
             return 0.0
 
         excess_return = (avg_return * 252) - risk_free_rate
@@ -206,18 +209,16 @@ class DatabasePerformanceCalculator:
         if len(values) < 2:
             return 0.0
 
-        running_max = values[0]
-        max_drawdown = 0.0
-
-        for value in values:
-            if value > running_max:
-                running_max = value
+        values_arr = np.asarray(values, dtype=np.float64)
 
-            if running_max > 0:
-                drawdown = (value - running_max) / running_max
-                if drawdown < max_drawdown:
-                    max_drawdown = drawdown
+        # Running peak via a cumulative max scan; drawdown only defined for positive peaks
+        running_max = np.maximum.accumulate(values_arr)
+        drawdowns = np.divide(
+            values_arr - running_max, running_max,
+            out=np.zeros_like(values_arr), where=running_max > 0
+        )
 
+        max_drawdown = min(0.0, float(drawdowns.min()))
         return round(max_drawdown * 100, 2)
 
     def calculate_beta(self, portfolio_returns: List[float],
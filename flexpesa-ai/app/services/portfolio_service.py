@@ -1,4 +1,6 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm import Session, selectinload, undefer
+from sqlalchemy.orm.util import identity_key
 from typing import List, Dict, Optional
 import logging
 from datetime import datetime
@@ -8,6 +10,7 @@ from app.schemas.portfolio import AccountCreateRequest, AssetCreateRequest
 from app.services.market_data import MarketDataService
 from app.services.enhanced_ai import LightweightAIService
 from app.core.config import settings
+from app.core.database import utcnow
 
 class PortfolioService:
     """Core portfolio management service with enhanced AI and Clerk authentication"""
@@ -71,7 +74,6 @@ class PortfolioService:
 
                 existing_asset.shares = total_shares
                 existing_asset.avg_cost = new_avg_cost
-                existing_asset.last_updated = datetime.utcnow()
 
                 self.db.commit()
                 self.db.refresh(existing_asset)
@@ -216,8 +218,9 @@ class PortfolioService:
 
             updated_count = 0
             failed_symbols = []
+            price_rows = []
 
-            # Update assets with new prices
+            # Collect new prices; written below in a single executemany UPDATE
             for asset in assets:
                 try:
                     if asset.symbol in current_prices and current_prices[asset.symbol] > 0:
@@ -225,13 +228,18 @@ class PortfolioService:
                         new_price = current_prices[asset.symbol]
 
                         # Calculate day change
+                        day_change = asset.day_change
+                        day_change_percent = asset.day_change_percent
                         if old_price and old_price > 0:
-                            asset.day_change = new_price - old_price
-                            asset.day_change_percent = ((new_price - old_price) / old_price) * 100
+                            day_change = new_price - old_price
+                            day_change_percent = ((new_price - old_price) / old_price) * 100
 
-                        asset.current_price = new_price
-                        asset.price_updated_at = datetime.utcnow()
-                        asset.last_updated = datetime.utcnow()
+                        price_rows.append({
+                            "asset_id": asset.id,
+                            "price": new_price,
+                            "day_change": day_change,
+                            "day_change_percent": day_change_percent
+                        })
 
                         updated_count += 1
 
@@ -245,6 +253,26 @@ class PortfolioService:
                     failed_symbols.append(asset.symbol)
                     logging.error(f"   ❌ {asset.symbol}: Update failed - {e}")
 
+            if price_rows:
+                assets_table = Asset.__table__
+                self.db.execute(
+                    update(assets_table)
+                    .where(assets_table.c.id == bindparam("asset_id"))
+                    .values(
+                        current_price=bindparam("price"),
+                        day_change=bindparam("day_change"),
+                        day_change_percent=bindparam("day_change_percent"),
+                        price_updated_at=utcnow(),
+                        last_updated=utcnow()
+                    ),
+                    price_rows
+                )
+                # Loaded Asset instances now hold pre-update values, and so do
+                # any loaded account totals computed from them
+                self._expire_account_totals({asset.account_id for asset in assets})
+                for asset in assets:
+                    self.db.expire(asset)
+
             # Update account balances
             if clerk_user_id:
                 self._update_account_balances(clerk_user_id)
@@ -277,8 +305,10 @@ class PortfolioService:
     async def get_portfolio_summary(self, clerk_user_id: str) -> Dict:
         """Get complete portfolio summary with enhanced AI analysis for specific user"""
         try:
-            # Get user's accounts
-            accounts = self.db.query(Account).filter(
+            # Get user's accounts, loading all their assets in one extra query
+            accounts = self.db.query(Account).options(
+                selectinload(Account.assets)
+            ).filter(
                 Account.clerk_user_id == clerk_user_id,
                 Account.is_active == True
             ).all()
@@ -288,21 +318,17 @@ class PortfolioService:
             total_cost_basis = 0
 
             for account in accounts:
-                # Calculate account value and update balance
-                account_value = 0
-                account_cost = 0
+                # Calculate position values for the whole account in one pass
+                active_assets = [asset for asset in account.assets if asset.is_active]
+                values, costs, pnls, pnl_percents = Asset.compute_bulk(active_assets)
+                account_value = float(values.sum())
+                account_cost = float(costs.sum())
 
                 # Build complete asset data for frontend
                 asset_data = []
-                for asset in account.assets:
-                    if not asset.is_active:
-                        continue
-
-                    current_value = asset.shares * (asset.current_price or asset.avg_cost)
-                    total_cost = asset.shares * asset.avg_cost
-                    pnl = current_value - total_cost
-                    pnl_percent = (pnl / total_cost * 100) if total_cost > 0 else 0
-
+                for asset, current_value, total_cost, pnl, pnl_percent in zip(
+                    active_assets, values.tolist(), costs.tolist(), pnls.tolist(), pnl_percents.tolist()
+                ):
                     asset_info = {
                         "id": asset.id,
                         "symbol": asset.symbol,
@@ -323,9 +349,6 @@ class PortfolioService:
                     }
                     asset_data.append(asset_info)
 
-                    account_value += current_value
-                    account_cost += total_cost
-
                 # Update account balance
                 account.balance = account_value
 
@@ -392,9 +415,18 @@ class PortfolioService:
             logging.error(f"Failed to get portfolio summary: {e}")
             raise
 
+    def _expire_account_totals(self, account_ids):
+        """Expire cached total_value on loaded accounts whose assets changed"""
+        for account_id in account_ids:
+            account = self.db.identity_map.get(identity_key(Account, account_id))
+            if account is not None:
+                self.db.expire(account, ["total_value"])
+
     def _update_account_balances(self, clerk_user_id: str):
         """Update account balances for user"""
-        accounts = self.db.query(Account).filter(
+        accounts = self.db.query(Account).options(
+            selectinload(Account.assets)
+        ).filter(
             Account.clerk_user_id == clerk_user_id,
             Account.is_active == True
         ).all()
@@ -411,13 +443,15 @@ class PortfolioService:
         try:
             if not data:
                 # Calculate snapshot data
-                accounts = self.db.query(Account).filter(
+                accounts = self.db.query(Account).options(
+                    undefer(Account.asset_count)
+                ).filter(
                     Account.clerk_user_id == clerk_user_id,
                     Account.is_active == True
                 ).all()
 
                 total_value = sum(account.balance for account in accounts)
-                total_assets = sum(len(account.assets) for account in accounts)
+                total_assets = sum(account.asset_count for account in accounts)
 
                 data = {
                     "total_value": total_value,
@@ -476,7 +510,10 @@ class PortfolioService:
                 if cached_data:
                     # Update existing
                     cached_data.current_price = prices[symbol]
-                    cached_data.updated_at = datetime.utcnow()
+                    cached_data.updated_at = utcnow()
+                    # Load the database timestamp back so is_stale/to_dict see a datetime
+                    self.db.flush()
+                    self.db.refresh(cached_data, ["updated_at"])
                     return cached_data
                 else:
                     # Create new
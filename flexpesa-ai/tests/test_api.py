@@ -4,6 +4,7 @@ Tests core API endpoints with auth disabled
 """
 
 import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi import status
 
 class TestHealthEndpoints:
@@ -25,6 +26,30 @@ class TestHealthEndpoints:
         assert "status" in data
         assert "timestamp" in data
 
+    def test_readiness_endpoint(self, test_client):
+        """Test readiness probe reports each dependency check"""
+        response = test_client.get("/health/ready")
+        assert response.status_code in (200, 503)
+        data = response.json()
+        assert data["checks"]["database"] is True
+        assert set(data["checks"]) == {"database", "redis", "auth"}
+        assert "timestamp" in data
+
+    def test_readiness_reuses_redis_client(self, test_client):
+        """Test readiness probes share one Redis client instead of opening one per probe"""
+        import app.main as main_module
+
+        client = MagicMock()
+        client.ping = AsyncMock(return_value=True)
+
+        with patch.object(main_module, "_health_redis_client", client):
+            for _ in range(3):
+                data = test_client.get("/health/ready").json()
+                assert data["checks"]["redis"] is True
+            assert main_module._health_redis_client is client
+
+        assert client.ping.await_count == 3
+
 class TestAuthConfiguration:
     """Test authentication configuration"""
 
@@ -194,6 +219,19 @@ class TestErrorHandling:
         response = test_client.get("/api/v1/nonexistent")
         assert response.status_code == 404
 
+    def test_cors_preflight_handled_by_middleware(self, test_client):
+        """Test CORS preflight is answered by CORSMiddleware"""
+        response = test_client.options(
+            "/api/v1/accounts/",
+            headers={
+                "Origin": "http://localhost:3000",
+                "Access-Control-Request-Method": "POST",
+                "Access-Control-Request-Headers": "authorization, content-type"
+            }
+        )
+        assert response.status_code == 200
+        assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+
     def test_malformed_json(self, test_client):
         """Test handling of malformed JSON"""
         response = test_client.post(
@@ -201,4 +239,4 @@ class TestErrorHandling:
             data="invalid json",
             headers={"content-type": "application/json"}
         )
-        assert response.status_code in [400, 422]
\ No newline at end of file
+        assert response.status_code in [400, 422]
@@ -80,6 +80,21 @@ class TestAssetCalculations:
         assert asset.market_value == 275.0  # 2.5 * 110
         assert asset.unrealized_pnl == 25.0  # 275 - 250
 
+    def test_compute_bulk_matches_properties(self):
+        """Test vectorized P&L matches the per-asset properties"""
+        assets = [
+            Asset(account_id=1, symbol="AAPL", shares=10, avg_cost=150.0, current_price=160.0),
+            Asset(account_id=1, symbol="MSFT", shares=2.5, avg_cost=300.0, current_price=None),
+            Asset(account_id=1, symbol="FREE", shares=5, avg_cost=0.0, current_price=10.0),
+        ]
+        values, costs, pnls, pnl_percents = Asset.compute_bulk(assets)
+
+        for i, asset in enumerate(assets):
+            assert values[i] == pytest.approx(asset.market_value)
+            assert costs[i] == pytest.approx(asset.cost_basis)
+            assert pnls[i] == pytest.approx(asset.unrealized_pnl)
+            assert pnl_percents[i] == pytest.approx(asset.unrealized_pnl_percent)
+
 class TestEdgeCases:
     """Test calculation edge cases"""
 
@@ -274,3 +289,26 @@ class TestPortfolioCalculations:
         assert total_cost_basis == expected_cost
         assert total_market_value == expected_market
         assert total_pnl == expected_pnl
+
+class TestPerformanceCalculations:
+    """Test portfolio performance metrics"""
+
+    def test_max_drawdown(self):
+        """Test max drawdown measures the deepest fall from a running peak"""
+        from app.services.perfomance import DatabasePerformanceCalculator
+
+        calculator = DatabasePerformanceCalculator(db=None)
+        assert calculator.calculate_max_drawdown([100, 120, 90, 130, 104]) == -25.0  # 120 -> 90
+        assert calculator.calculate_max_drawdown([100, 110, 120]) == 0.0
+
+    def test_sharpe_ratio(self):
+        """Test Sharpe ratio uses annualized mean and sample volatility"""
+        import statistics
+        from app.services.perfomance import DatabasePerformanceCalculator
+
+        calculator = DatabasePerformanceCalculator(db=None)
+        returns = [0.01, -0.005, 0.002, 0.008, -0.003]
+        expected = ((statistics.mean(returns) * 252) - 0.02) / (statistics.stdev(returns) * 252 ** 0.5)
+
+        assert calculator.calculate_sharpe_ratio(returns, risk_free_rate=0.02) == round(expected, 3)
+        assert calculator.calculate_sharpe_ratio([0.1, 0.1, 0.1]) == 0.0
@@ -78,9 +78,86 @@ class TestDatabaseBasics:
         expected_value = sample_asset.shares * sample_asset.current_price
         assert sample_account.total_value == expected_value
 
+    def test_account_totals_for_user(self, test_db, sample_account, sample_asset):
+        """Test per-account totals come back from one aggregate query"""
+        unpriced = Asset(account_id=sample_account.id, symbol="NEW", shares=2, avg_cost=50.0, current_price=0.0)
+        test_db.add(unpriced)
+        test_db.commit()
+
+        totals = dict(Account.totals_for_user(test_db, sample_account.clerk_user_id))
+
+        # Zero current price falls back to average cost, like Asset.market_value
+        expected_value = sample_asset.shares * sample_asset.current_price + 2 * 50.0
+        assert totals[sample_account.id] == expected_value
+
+        test_db.refresh(sample_account)
+        assert sample_account.asset_count == 2
+        assert sample_account.to_dict()["asset_count"] == 2
+
+    def test_account_aggregates_are_deferred(self, test_db, sample_account, sample_asset):
+        """Test plain account loads skip the aggregate subqueries unless undeferred"""
+        from sqlalchemy import inspect
+        from sqlalchemy.orm import undefer
+
+        account_id = sample_account.id
+        expected_value = sample_asset.shares * sample_asset.current_price
+
+        test_db.expunge_all()
+        account = test_db.query(Account).filter(Account.id == account_id).one()
+        assert {"total_value", "asset_count"} <= inspect(account).unloaded
+
+        test_db.expunge_all()
+        account = test_db.query(Account).options(
+            undefer(Account.total_value)
+        ).filter(Account.id == account_id).one()
+        assert "total_value" not in inspect(account).unloaded
+        assert account.total_value == expected_value
+
+    def test_bulk_price_update_expires_account_total(self, test_db, sample_account, sample_asset):
+        """Test a loaded account total is reloaded after a bulk price UPDATE in the same session"""
+        from sqlalchemy import update
+        from app.services.portfolio_service import PortfolioService
+
+        assert sample_account.total_value == sample_asset.shares * 155.0
+
+        test_db.execute(update(Asset).where(Asset.id == sample_asset.id).values(current_price=200.0))
+        # Core UPDATEs bypass the identity map, so the loaded total is stale until expired
+        assert sample_account.total_value == sample_asset.shares * 155.0
+
+        PortfolioService(test_db)._expire_account_totals({sample_account.id})
+        assert sample_account.total_value == sample_asset.shares * 200.0
+
+    def test_asset_to_dict_is_json_serializable(self, test_db, sample_asset):
+        """Test to_dict output encodes with plain json, timestamps as ISO strings"""
+        import json
+
+        data = sample_asset.to_dict()
+        assert data["market_value"] == sample_asset.market_value
+        assert data["created_at"] == sample_asset.created_at.isoformat()
+        assert data["price_updated_at"] is None or isinstance(data["price_updated_at"], str)
+
+        assert json.loads(json.dumps(data)) == data
+
 class TestDatabaseQueries:
     """Test database query operations"""
 
+    def test_market_data_stale_symbols(self, test_db):
+        """Test staleness is filtered in SQL and matches the instance check"""
+        from datetime import datetime, timedelta
+        from app.models.portfolio import MarketData
+
+        test_db.add_all([
+            MarketData(symbol="OLD", current_price=10.0, updated_at=datetime.utcnow() - timedelta(hours=1)),
+            MarketData(symbol="NEW", current_price=20.0, updated_at=datetime.utcnow()),
+        ])
+        test_db.commit()
+
+        assert MarketData.stale_symbols(test_db) == ["OLD"]
+        assert MarketData.stale_symbols(test_db, max_age_minutes=120) == []
+        stale = test_db.query(MarketData).filter(MarketData.is_stale).all()
+        assert [entry.symbol for entry in stale] == ["OLD"]
+        assert stale[0].is_stale is True
+
     def test_query_accounts(self, test_db, sample_account):
         """Test querying accounts"""
         accounts = test_db.query(Account).all()
@@ -191,6 +191,67 @@ class TestEnvironment:
         assert settings.DATABASE_URL is not None
         assert len(settings.DATABASE_URL) > 0
 
+    def test_env_file_read_once(self, tmp_path, monkeypatch):
+        """Test .env is parsed once, not on every Settings() construction"""
+        import builtins
+        from app.core import config
+
+        (tmp_path / ".env").write_text("PROJECT_NAME=From Dotenv\n")
+        monkeypatch.chdir(tmp_path)
+
+        env_file_reads = []
+        real_open = builtins.open
+
+        def counting_open(file, *args, **kwargs):
+            if str(file).endswith(".env"):
+                env_file_reads.append(file)
+            return real_open(file, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, "open", counting_open)
+        monkeypatch.setattr(config, "_DOTENV_VALUES", config._load_dotenv(config.ENV_FILE))
+
+        constructed = [config.Settings() for _ in range(3)]
+
+        assert len(env_file_reads) == 1
+        assert all(s.PROJECT_NAME == "From Dotenv" for s in constructed)
+
+    def test_log_queue_only_used_while_listener_runs(self):
+        """Test records go straight to handlers until the listener starts, and late handlers are fed"""
+        import logging
+        from logging.handlers import QueueHandler
+        from app.core import logging_config
+
+        class ListHandler(logging.Handler):
+            def __init__(self):
+                super().__init__()
+                self.messages = []
+
+            def emit(self, record):
+                self.messages.append(record.getMessage())
+
+        root_logger = logging.getLogger()
+        early, late = ListHandler(), ListHandler()
+        logging_config.add_log_handler(early)
+        try:
+            assert early in root_logger.handlers
+            assert not any(isinstance(h, QueueHandler) for h in root_logger.handlers)
+
+            logging_config.start_log_listener()
+            assert early not in root_logger.handlers
+            logging_config.add_log_handler(late)
+            logging.getLogger("test.queue").warning("queued")
+            logging_config.stop_log_listener()
+
+            assert early.messages == ["queued"]
+            assert late.messages == ["queued"]
+            assert not any(isinstance(h, QueueHandler) for h in root_logger.handlers)
+            assert late in root_logger.handlers
+        finally:
+            logging_config.stop_log_listener()
+            for handler in (early, late):
+                logging_config._handlers.remove(handler)
+                root_logger.removeHandler(handler)
+
 
 class TestRealDatabaseHealth:
     """Tests for real database (when available) - skip if not configured"""
@@ -0,0 +1,228 @@
+"""
+Middleware tests - auth, rate limiting and request tracing
+Tests the custom ASGI middleware directly and through small apps
+"""
+
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.middleware.clerk_auth import ClerkAuthMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware, RateLimitRule
+
+
+class TestMiddleware:
+    """Test headers added by the custom middleware stack"""
+
+    def test_request_tracing_headers(self, test_client):
+        """Test logging middleware tags responses with request ID and timing"""
+        response = test_client.get("/health")
+        assert response.status_code == 200
+        assert response.headers["X-Request-ID"]
+        assert float(response.headers["X-Process-Time"]) >= 0
+
+    def test_clerk_auth_rejects_unauthenticated_api_calls(self, caplog):
+        """Test Clerk middleware answers 401 itself, logs it, and lets public paths through"""
+        app = FastAPI()
+
+        @app.get("/api/v1/private")
+        def private(request: Request):
+            return {"user": request.state.user}
+
+        @app.get("/health")
+        def health():
+            return {"status": "healthy"}
+
+        app.add_middleware(ClerkAuthMiddleware)
+        client = TestClient(app)
+
+        with caplog.at_level("WARNING", logger="app.middleware.clerk_auth"):
+            response = client.get("/api/v1/private")
+        assert response.status_code == 401
+        assert response.json()["message"] == "Authentication required"
+
+        # LoggingMiddleware never sees this rejection, so it is tagged and logged here
+        request_id = response.headers["X-Request-ID"]
+        assert f"[{request_id}] GET /api/v1/private - 401" in caplog.text
+
+        assert client.get("/health").status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_clerk_jwks_fetched_once_under_concurrency(self):
+        """Test concurrent JWKS lookups share a single fetch"""
+        middleware = ClerkAuthMiddleware(None)
+        response = MagicMock()
+        response.json.return_value = {"keys": [{"kid": "key-1"}]}
+
+        http_client = MagicMock()
+        http_client.get = AsyncMock(return_value=response)
+
+        with patch("app.middleware.clerk_auth._get_http_client", return_value=http_client), \
+             patch("app.middleware.clerk_auth.RSAAlgorithm.from_jwk", return_value="public-key"):
+            results = await asyncio.gather(*[middleware._get_clerk_jwks() for _ in range(5)])
+
+        assert http_client.get.await_count == 1
+        assert all(result["key-1"] == "public-key" for result in results)
+
+    @pytest.mark.asyncio
+    async def test_clerk_token_requires_standard_claims(self):
+        """Test tokens are verified against the cached key and must carry exp/iss/aud"""
+        import time
+        import jwt
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from app.core.config import settings
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        middleware = ClerkAuthMiddleware(None)
+        claims = {
+            "sub": "user_123",
+            "iss": f"https://{settings.CLERK_DOMAIN}",
+            "aud": "pk_test_123",
+            "exp": int(time.time()) + 60
+        }
+
+        def bearer(payload):
+            return "Bearer " + jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": "key-1"})
+
+        with patch.object(settings, "CLERK_PUBLISHABLE_KEY", "pk_test_123"), \
+             patch.object(middleware, "_get_clerk_jwks", AsyncMock(return_value={"key-1": private_key.public_key()})):
+            token = bearer(claims)
+            payload = await middleware._validate_clerk_token(token)
+            assert payload["sub"] == "user_123"
+
+            # Second use of the same token is served from the verified-token cache
+            with patch("app.middleware.clerk_auth.jwt.decode") as mock_decode:
+                assert await middleware._validate_clerk_token(token) == payload
+                mock_decode.assert_not_called()
+
+            # The cached claims are shared across requests, so they are read-only
+            with pytest.raises(TypeError):
+                payload["sub"] = "user_456"
+            assert (await middleware._validate_clerk_token(token))["sub"] == "user_123"
+
+            no_exp = {k: v for k, v in claims.items() if k != "exp"}
+            assert await middleware._validate_clerk_token(bearer(no_exp)) is None
+
+            wrong_issuer = {**claims, "iss": "https://evil.example.com"}
+            assert await middleware._validate_clerk_token(bearer(wrong_issuer)) is None
+
+    def test_rate_limit_token_bucket_refills(self):
+        """Test a client bucket drains to the endpoint limit and refills over the window"""
+        limiter = RateLimitMiddleware(None)
+        path = "/api/v1/portfolio/update-prices"
+        rule = limiter._get_rate_limit(path)
+
+        for expected_remaining in range(rule.limit - 1, -1, -1):
+            assert limiter._check_and_record("ip:test", rule, 1000.0) == (True, expected_remaining)
+
+        assert limiter._check_and_record("ip:test", rule, 1000.0) == (False, 0)
+
+        # One window-fraction later a single token is available again
+        assert limiter._check_and_record("ip:test", rule, 1000.0 + limiter.window_size / rule.limit)[0]
+
+    def test_rate_limit_endpoint_buckets_are_separate(self):
+        """Test draining a strict endpoint leaves the general allowance untouched"""
+        limiter = RateLimitMiddleware(None)
+        strict = limiter._get_rate_limit("/api/v1/portfolio/update-prices")
+        general = limiter._get_rate_limit("/api/v1/accounts/")
+        assert strict.limit < general.limit
+
+        for _ in range(strict.limit):
+            limiter._check_and_record("ip:test", strict, 1000.0)
+        assert limiter._check_and_record("ip:test", strict, 1000.0) == (False, 0)
+
+        assert limiter._check_and_record("ip:test", general, 1000.0) == (True, general.capacity - 1)
+
+    def test_rate_limit_evicts_least_recent_clients(self):
+        """Test bucket storage stays bounded without a background cleanup task"""
+        limiter = RateLimitMiddleware(None)
+        limiter.max_clients = 2
+
+        for client_id in ("ip:a", "ip:b", "ip:a", "ip:c"):
+            limiter._check_and_record(client_id, limiter._default_rule, 1000.0)
+
+        assert [client_id for client_id, _ in limiter.buckets] == ["ip:a", "ip:c"]
+
+    def test_rate_limit_rejects_with_429(self, caplog):
+        """Test rate limit middleware adds limit headers, answers 429 itself and logs it"""
+        app = FastAPI()
+
+        @app.post("/api/v1/portfolio/update-prices")
+        def update_prices():
+            return {"updated": True}
+
+        app.add_middleware(RateLimitMiddleware)
+        client = TestClient(app)
+
+        first = client.post("/api/v1/portfolio/update-prices")
+        assert first.status_code == 200
+        limit = int(first.headers["X-Rate-Limit-Limit"])
+        assert int(first.headers["X-Rate-Limit-Remaining"]) == limit - 1
+
+        for _ in range(limit - 1):
+            client.post("/api/v1/portfolio/update-prices")
+
+        with caplog.at_level("WARNING", logger="app.middleware.rate_limit"):
+            response = client.post("/api/v1/portfolio/update-prices")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"]
+        assert response.json()["details"]["limit"] == limit
+
+        request_id = response.headers["X-Request-ID"]
+        assert f"[{request_id}] POST /api/v1/portfolio/update-prices - 429" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_redis_bucket_matches_memory_rule(self):
+        """Test the shared Redis bucket gets the same capacity and refill rate as memory, and fails open"""
+        limiter = RateLimitMiddleware(None)
+        limiter._redis_bucket = AsyncMock(return_value=[1, 41])
+        rule = limiter._default_rule
+
+        assert await limiter._check_rate_limit_redis("ip:test", rule) == (True, 41)
+
+        # Keyed per client and rule; burst capacity included so Redis and memory agree
+        call = limiter._redis_bucket.await_args.kwargs
+        assert call["keys"] == ["rl:ip:test:default"]
+        capacity, rate, ttl = call["args"]
+        assert capacity == rule.capacity == max(limiter.max_requests, limiter.burst_limit)
+        assert rate == rule.limit / limiter.window_size
+        assert ttl >= rule.capacity / rate
+
+        limiter._redis_bucket.return_value = [0, 0]
+        assert await limiter._check_rate_limit_redis("ip:test", rule) == (False, 0)
+
+        limiter._redis_bucket.side_effect = ConnectionError("redis down")
+        assert await limiter._check_rate_limit_redis("ip:test", rule) is None
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_redis_cooldown_after_failure(self):
+        """Test a Redis failure skips Redis for the cooldown and is logged once per outage"""
+        from app.core.config import settings
+
+        limiter = RateLimitMiddleware(None)
+        limiter._redis_bucket = AsyncMock(side_effect=ConnectionError("redis down"))
+        rule = RateLimitRule("default", 20, 20)
+
+        with patch("app.middleware.rate_limit.time.monotonic", return_value=1000.0), \
+             patch("app.middleware.rate_limit.logger") as mock_logger:
+            assert await limiter._check_rate_limit_redis("ip:test", rule) is None
+            assert await limiter._check_rate_limit_redis("ip:test", rule) is None
+            assert limiter._redis_bucket.await_count == 1
+
+        # Still down after the cooldown: retried, but not logged again
+        retry_at = 1000.0 + settings.RATE_LIMIT_REDIS_COOLDOWN
+        with patch("app.middleware.rate_limit.time.monotonic", return_value=retry_at), \
+             patch("app.middleware.rate_limit.logger") as mock_logger_retry:
+            assert await limiter._check_rate_limit_redis("ip:test", rule) is None
+            assert limiter._redis_bucket.await_count == 2
+            mock_logger_retry.warning.assert_not_called()
+
+        mock_logger.warning.assert_called_once()
+
+        limiter._redis_bucket.side_effect = None
+        limiter._redis_bucket.return_value = [1, 19]
+        with patch("app.middleware.rate_limit.time.monotonic", return_value=retry_at * 2):
+            assert (await limiter._check_rate_limit_redis("ip:test", rule))[0]
+        assert not limiter._redis_down
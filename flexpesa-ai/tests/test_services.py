@@ -176,6 +176,8 @@ class TestPortfolioServiceWithMocks:
         # Check that price was updated
         test_db.refresh(sample_asset)
         assert sample_asset.current_price == 175.0
+        assert sample_asset.day_change == pytest.approx(20.0)
+        assert sample_asset.price_updated_at is not None
 
     @pytest.mark.asyncio
     async def test_update_prices_market_data_failure(self, test_db, sample_account, sample_asset):
@@ -192,6 +194,25 @@ class TestPortfolioServiceWithMocks:
         assert result["updated_assets"] == 0
         assert "AAPL" in result["failed_symbols"]
 
+    @pytest.mark.asyncio
+    async def test_refreshed_market_data_is_usable_before_commit(self, test_db):
+        """Test a refreshed cache entry carries a real timestamp, not a SQL expression"""
+        from datetime import datetime, timedelta
+        from app.models.portfolio import MarketData
+
+        cached = MarketData(symbol="AAPL", current_price=150.0, updated_at=datetime.utcnow() - timedelta(hours=1))
+        test_db.add(cached)
+        test_db.commit()
+
+        service = PortfolioService(test_db)
+        with patch.object(service, 'market_data') as mock_market:
+            mock_market.get_current_prices.return_value = {"AAPL": 175.0}
+            result = await service._get_or_fetch_market_data("AAPL")
+
+        assert isinstance(result.updated_at, datetime)
+        assert result.is_stale is False
+        assert result.to_dict()["current_price"] == 175.0
+
 class TestPortfolioServiceIntegration:
     """Test service integration scenarios"""
 
@@ -344,3 +365,232 @@ class TestErrorHandling:
         assert "recommendation" in result
         assert "insights" in result
         assert isinstance(result["insights"], list)
+
+class TestMarketDataService:
+    """Test market data fetching"""
+
+    def test_batch_prices_single_download(self):
+        """Test prices for several symbols come from one batched download"""
+        import numpy as np
+        import pandas as pd
+        from app.services.market_data import MarketDataService
+
+        columns = pd.MultiIndex.from_product([["Close", "Open"], ["AAPL", "MSFT"]])
+        data = pd.DataFrame(
+            [[150.0, 300.0, 149.0, 299.0], [155.0, np.nan, 151.0, 301.0]],
+            index=pd.date_range("2024-01-01", periods=2),
+            columns=columns
+        )
+        service = MarketDataService()
+
+        with patch("app.services.market_data.yf.download", return_value=data) as mock_download, \
+             patch.object(service, "_get_single_price_safe", return_value=0.0) as mock_single:
+            prices = service._fetch_real_prices(["AAPL", "MSFT"])
+
+        mock_download.assert_called_once()
+        mock_single.assert_not_called()
+        # MSFT's missing latest close falls back to the previous day
+        assert prices == {"AAPL": 155.0, "MSFT": 300.0}
+
+    def test_unchanged_price_refreshes_cache_timestamp(self, test_db):
+        """Test re-caching the same price still clears the stale flag"""
+        from datetime import datetime, timedelta
+        from app.models.portfolio import MarketData
+        from app.services.market_data import MarketDataService
+
+        cached = MarketData(
+            symbol="AAPL",
+            current_price=150.0,
+            updated_at=datetime.utcnow() - timedelta(minutes=MarketData.STALE_AFTER_MINUTES + 5)
+        )
+        test_db.add(cached)
+        test_db.commit()
+        assert cached.is_stale
+
+        MarketDataService(test_db)._update_market_data_cache("AAPL", 150.0)
+        test_db.refresh(cached)
+
+        assert not cached.is_stale
+
+class TestLightweightAIService:
+    """Test technical analysis in the lightweight AI service"""
+
+    @pytest.fixture(autouse=True)
+    def clear_caches(self):
+        """Start every test with empty process-wide caches"""
+        from app.services import enhanced_ai
+
+        enhanced_ai._history_cache.clear()
+        enhanced_ai._news_cache.clear()
+        yield
+        enhanced_ai._history_cache.clear()
+        enhanced_ai._news_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_technical_batch_uses_single_download(self):
+        """Test indicators for all symbols come from one batched download"""
+        import numpy as np
+        import pandas as pd
+        from app.services.enhanced_ai import LightweightAIService
+
+        index = pd.date_range("2024-01-01", periods=60)
+        columns = pd.MultiIndex.from_product([["AAPL", "MSFT"], ["Close", "Volume"]])
+        prices = np.linspace(100, 160, 60)
+        data = pd.DataFrame(
+            np.column_stack([prices, np.ones(60), prices * 2, np.ones(60)]),
+            index=index, columns=columns
+        )
+        service = LightweightAIService()
+
+        with patch("yfinance.download", return_value=data) as mock_download, \
+             patch("yfinance.Ticker") as mock_ticker:
+            result = await service._get_basic_technical_batch(["AAPL", "MSFT"])
+
+        mock_download.assert_called_once()
+        mock_ticker.assert_not_called()
+        assert result["AAPL"].sma_20 == pytest.approx(prices[-20:].mean())
+        assert result["MSFT"].sma_20 == pytest.approx(2 * prices[-20:].mean())
+        # Steadily rising prices: no losses, RSI saturates
+        assert result["AAPL"].rsi == 100.0
+
+    def test_simple_rsi_matches_pandas_reference(self):
+        """Test NumPy RSI matches the rolling-mean definition"""
+        import numpy as np
+        import pandas as pd
+        from app.services.enhanced_ai import LightweightAIService
+
+        prices = pd.Series(100 + np.cumsum(np.random.default_rng(7).normal(0, 1, 60)))
+        delta = prices.diff()
+        avg_gain = delta.where(delta > 0, 0).tail(14).mean()
+        avg_loss = -delta.where(delta < 0, 0).tail(14).mean()
+        expected = 100 - 100 / (1 + avg_gain / avg_loss)
+
+        service = LightweightAIService()
+        assert service._calculate_simple_rsi(prices, period=14) == pytest.approx(expected)
+        assert service._calculate_simple_rsi(prices.head(10), period=14) == 50.0
+
+    def test_compute_indicators_matches_pandas_reference(self):
+        """Test fused NumPy indicators match the pandas formulas"""
+        import numpy as np
+        import pandas as pd
+        from app.services.enhanced_ai import LightweightAIService
+
+        closes = pd.Series(100 + np.cumsum(np.random.default_rng(3).normal(0, 1, 45)))
+        indicators = LightweightAIService()._compute_indicators(closes)
+
+        current = closes.iloc[-1]
+        assert indicators.sma_20 == pytest.approx(closes.tail(20).mean())
+        assert indicators.sma_50 == pytest.approx(closes.mean())  # fewer than 50 closes
+        assert indicators.volatility == pytest.approx(closes.pct_change().dropna().std() * np.sqrt(252))
+        assert indicators.momentum == pytest.approx((current / closes.iloc[-10] - 1) * 100)
+        assert indicators.price_change_5d == pytest.approx((current / closes.iloc[-5] - 1) * 100)
+        assert indicators.price_change_20d == pytest.approx((current / closes.iloc[-20] - 1) * 100)
+
+    @pytest.mark.asyncio
+    async def test_technical_batch_falls_back_per_symbol(self):
+        """Test symbols missing from the batch are fetched individually"""
+        import numpy as np
+        import pandas as pd
+        from app.services.enhanced_ai import LightweightAIService
+
+        history = pd.DataFrame({"Close": np.linspace(100, 90, 30)}, index=pd.date_range("2024-01-01", periods=30))
+        service = LightweightAIService()
+
+        with patch("yfinance.download", return_value=pd.DataFrame()), \
+             patch("yfinance.Ticker") as mock_ticker:
+            mock_ticker.return_value.history.return_value = history
+            result = await service._get_basic_technical_batch(["AAPL", "MSFT"])
+
+        assert mock_ticker.call_count == 2
+        # Steadily falling prices: no gains, RSI bottoms out
+        assert result["AAPL"].rsi == 0.0
+        assert result["MSFT"].price_change_5d < 0
+
+    @pytest.mark.asyncio
+    async def test_price_history_cached_between_analyses(self):
+        """Test repeated analyses reuse cached daily bars"""
+        import numpy as np
+        import pandas as pd
+        from app.services.enhanced_ai import LightweightAIService
+
+        history = pd.DataFrame({"Close": np.linspace(100, 120, 30)}, index=pd.date_range("2024-01-01", periods=30))
+
+        with patch("yfinance.download", return_value=pd.DataFrame()) as mock_download, \
+             patch("yfinance.Ticker") as mock_ticker:
+            mock_ticker.return_value.history.return_value = history
+            first = await LightweightAIService()._get_basic_technical_batch(["AAPL"])
+            second = await LightweightAIService()._get_basic_technical_batch(["AAPL"])
+
+        assert mock_download.call_count == 1
+        assert mock_ticker.call_count == 1
+        assert first["AAPL"] == second["AAPL"]
+
+    @pytest.mark.asyncio
+    async def test_news_fetch_reuses_shared_session(self):
+        """Test news requests go through the shared session and are cached"""
+        from app.services import enhanced_ai
+
+        response = MagicMock(status=200)
+        response.json = AsyncMock(return_value={"articles": [{"title": "AAPL beats earnings"}]})
+        session = MagicMock()
+        session.get.return_value.__aenter__ = AsyncMock(return_value=response)
+        session.get.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        service = enhanced_ai.LightweightAIService(news_api_key="test-key")
+        with patch.object(enhanced_ai, "_get_http_session", return_value=session):
+            first = await service._fetch_news_fast("AAPL")
+            second = await enhanced_ai.LightweightAIService(news_api_key="test-key")._fetch_news_fast("AAPL")
+
+        assert first == second == [{"title": "AAPL beats earnings"}]
+        session.get.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_news_fetch_backs_off_on_429(self):
+        """Test a 429 from NewsAPI is retried after a backoff"""
+        from app.services import enhanced_ai
+
+        limited = MagicMock(status=429)
+        ok = MagicMock(status=200)
+        ok.json = AsyncMock(return_value={"articles": [{"title": "MSFT rally"}]})
+        session = MagicMock()
+        session.get.return_value.__aenter__ = AsyncMock(side_effect=[limited, ok])
+        session.get.return_value.__aexit__ = AsyncMock(return_value=False)
+
+        service = enhanced_ai.LightweightAIService(news_api_key="test-key")
+        with patch.object(enhanced_ai, "_get_http_session", return_value=session), \
+             patch.object(enhanced_ai, "_NEWS_BACKOFF_BASE", 0.0):
+            articles = await service._fetch_news_fast("MSFT")
+
+        assert articles == [{"title": "MSFT rally"}]
+        assert session.get.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_paces_after_burst(self):
+        """Test the token bucket waits once its burst capacity is spent"""
+        from types import SimpleNamespace
+        from app.services.enhanced_ai import AsyncTokenBucket
+
+        # Fake clock: sleeping advances it instead of waiting
+        clock = [0.0]
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        with patch("app.services.enhanced_ai.time", SimpleNamespace(monotonic=lambda: clock[0])), \
+             patch("app.services.enhanced_ai.asyncio", SimpleNamespace(sleep=fake_sleep)):
+            bucket = AsyncTokenBucket(rate=2, capacity=2)
+
+            await bucket.acquire()
+            await bucket.acquire()
+            assert sleeps == []
+
+            # Bucket empty: one token takes 1 / rate seconds to refill
+            await bucket.acquire()
+            assert sleeps == [0.5]
+
+            # A quarter second later half a token has refilled
+            clock[0] += 0.25
+            await bucket.acquire()
+            assert sleeps == [0.5, 0.25]
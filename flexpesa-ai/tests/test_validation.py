@@ -246,6 +246,11 @@ class TestUpdateValidation:
             for msg in error_messages
         )
 
+    def test_asset_update_zero_price_counts_as_provided(self):
+        """Test explicit zero values are treated as provided fields"""
+        update = AssetUpdate(current_price=0.0)
+        assert update.current_price == 0.0
+
     def test_account_update_empty_name_fails(self):
         """Test account update with empty name fails"""
         with pytest.raises(ValidationError) as exc_info:
@@ -359,6 +364,17 @@ class TestBulkValidation:
         # Should have some validation error (either custom or field-level)
         assert len(exc_info.value.errors()) > 0
 
+    def test_duplicate_symbols_case_insensitive(self):
+        """Test symbols differing only in case count as duplicates"""
+        with pytest.raises(ValidationError) as exc_info:
+            BulkAssetCreateRequest(account_id=1, assets=[
+                {"symbol": "aapl", "shares": 10, "avg_cost": 150},
+                {"symbol": "AAPL", "shares": 5, "avg_cost": 160}
+            ])
+
+        error_messages = extract_error_messages(exc_info.value)
+        assert any("Duplicate symbols" in msg for msg in error_messages)
+
 
 class TestRealWorldScenarios:
     """Test realistic usage scenarios"""
@@ -458,4 +474,43 @@ class TestErrorMessageQuality:
             )
 
         errors = exc_info.value.errors()
-        assert len(errors) >= 3  # Should catch all range errors
\ No newline at end of file
+        assert len(errors) >= 3  # Should catch all range errors
+
+class TestAnalyticsValidation:
+    """Test analytics and risk model validation"""
+
+    def test_sector_exposure_sums_to_100(self):
+        """Test many small sector weights summing to 100 are accepted"""
+        from app.schemas.portfolio import RiskAssessment
+
+        exposure = {f"sector_{i}": 0.1 for i in range(1000)}
+        risk = RiskAssessment(risk_level="Moderate", concentration_risk=10, sector_exposure=exposure)
+        assert risk.risk_level == "moderate"
+
+    def test_sector_exposure_must_sum_to_100(self):
+        """Test sector exposure not summing to 100 fails"""
+        from app.schemas.portfolio import RiskAssessment
+
+        with pytest.raises(ValidationError):
+            RiskAssessment(risk_level="moderate", concentration_risk=10, sector_exposure={"tech": 60.0, "energy": 30.0})
+
+    def test_currency_codes_normalized(self):
+        """Test currency codes are upper-cased and must be 3 ASCII letters"""
+        from datetime import datetime
+        from app.schemas.portfolio import CurrencyConversion
+
+        conversion = CurrencyConversion(
+            base_currency="usd", target_currency="Eur", exchange_rate=0.9,
+            conversion_date=datetime(2024, 1, 1)
+        )
+        assert (conversion.base_currency, conversion.target_currency) == ("USD", "EUR")
+
+        for bad_code in ("U1D", "ÄÖÜ"):
+            with pytest.raises(ValidationError):
+                CurrencyConversion(
+                    base_currency=bad_code, target_currency="EUR", exchange_rate=1.0,
+                    conversion_date=datetime(2024, 1, 1)
+                )
+
+        with pytest.raises(ValidationError):
+            AccountCreateRequest(name="Test", account_type="brokerage", currency="12$")